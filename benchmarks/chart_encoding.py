@@ -0,0 +1,83 @@
+"""bytes and encode time of report charts for every output format
+
+python -m benchmarks.chart_encoding [--repeat 20] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from lib.chart_builder import WeekDrawer, MonthDrawer
+
+ENCODINGS = [
+    {'output_format': 'png', 'dpi': 100},
+    {'output_format': 'png', 'dpi': 80},
+    {'output_format': 'png8', 'dpi': 80, 'colors': 16},
+    {'output_format': 'png8', 'dpi': 80, 'colors': 8},
+    {'output_format': 'webp', 'dpi': 80, 'quality': 80},
+    {'output_format': 'jpeg', 'dpi': 80, 'quality': 80},
+]
+
+
+def synthetic_marks(days: int, per_day: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2023-01-02T00:00:00')
+    offsets = np.sort(rng.integers(0, days * 86400, days * per_day))
+    return start + offsets.astype('timedelta64[s]'), rng.integers(0, 5, days * per_day).astype(np.int8)
+
+
+def benchmark_encoding(drawer, x_dates, y, repeat: int) -> dict:
+    fig, ax = drawer.get_template()
+    lines = ax.plot(x_dates, y, 'r*', markersize=12)
+    try:
+        chart = drawer.encode(fig)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            drawer.encode(fig)
+        encode_ms = (time.perf_counter() - start) / repeat * 1000
+    finally:
+        for line in lines:
+            line.remove()
+        ax.relim()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        drawer.render(x_dates, y)
+    render_ms = (time.perf_counter() - start) / repeat * 1000
+
+    return {
+        'drawer': type(drawer).__name__,
+        'encoding': drawer.encoding_key(),
+        'bytes': len(chart),
+        'encode_ms': round(encode_ms, 2),
+        'render_ms': round(render_ms, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    args = parser.parse_args()
+
+    results = []
+    for drawer_class, days in ((WeekDrawer, 7), (MonthDrawer, 30)):
+        x_dates, y = synthetic_marks(days, per_day=4)
+        for encoding in ENCODINGS:
+            results.append(benchmark_encoding(drawer_class(**encoding), x_dates, y, args.repeat))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        print(f"{result['drawer']:12} {result['encoding']:18} {result['bytes']:8} bytes "
+              f"{result['encode_ms']:8} ms encode {result['render_ms']:8} ms render")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""import time of the bot entry point measured with python -X importtime,
+exit code is not zero if it is over budget or a deferred dependency is imported, could be used in CI
+
+python -m benchmarks.import_time [--budget-ms 1000] [--runs 5] [--top 10] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)
+
+# loaded with the first chart or analytics report, never with main
+DEFERRED_MODULES = ('numpy', 'matplotlib', 'PIL', 'sqlalchemy_utils')
+
+
+def measure_import(module: str = 'main') -> dict[str, int]:
+    """cumulative import time in microseconds of every module imported by a fresh interpreter"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def check_import_time(budget_ms: float, runs: int = 5, top: int = 10) -> dict:
+    totals = []
+    for _ in range(runs):
+        modules = measure_import()
+        totals.append(modules['main'] / 1000)
+
+    slowest = sorted(
+        ((name, cumulative) for name, cumulative in modules.items() if name != 'main'),
+        key=lambda item: item[1], reverse=True,
+    )[:top]
+    deferred = sorted(name for name in modules if name.split('.')[0] in DEFERRED_MODULES)
+    total_ms = statistics.median(totals)
+
+    return {
+        'total_ms': round(total_ms, 1),
+        'budget_ms': budget_ms,
+        'over_budget': total_ms > budget_ms,
+        'deferred_imported': deferred,
+        'slowest': [{'module': name, 'ms': round(cumulative / 1000, 1)} for name, cumulative in slowest],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget-ms', type=float, default=1000)
+    parser.add_argument('--runs', type=int, default=5, help='median of runs is compared with budget')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    args = parser.parse_args()
+
+    result = check_import_time(args.budget_ms, args.runs, args.top)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"import main: {result['total_ms']} ms, budget {result['budget_ms']} ms")
+        for item in result['slowest']:
+            print(f"{item['module']:40} {item['ms']:8} ms")
+        if result['deferred_imported']:
+            print(f"deferred modules were imported: {', '.join(result['deferred_imported'])}")
+
+    sys.exit(1 if result['over_budget'] or result['deferred_imported'] else 0)
+
+
+if __name__ == '__main__':
+    main()
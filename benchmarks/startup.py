@@ -0,0 +1,136 @@
+"""time to first handled update and to loaded notification index for a database of synthetic users,
+bot api is replaced by a local fake server, so nothing is sent to telegram
+
+python -m benchmarks.startup [--users 100000] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+import lib.utils as ut
+from benchmarks.synthetic import create_synthetic_db
+from configs.definitions import ROOT_DIR
+
+TOKEN = '123456:benchmark'
+
+
+class FakeBotApi(BaseHTTPRequestHandler):
+    """answers every bot api method with success, getMe with a fake bot"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        method = self.path.rsplit('/', 1)[-1]
+        result = True
+        if method == 'getMe':
+            result = {'id': 123456, 'is_bot': True, 'first_name': 'benchmark', 'username': 'benchmark_bot'}
+        body = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_bot_api() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBotApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def probe_update(bot) -> Update:
+    message = {
+        'message_id': 1,
+        'date': int(time.time()),
+        'chat': {'id': 1, 'type': 'private'},
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'benchmark'},
+        'text': 'ping',
+    }
+    return Update.de_json({'update_id': 1, 'message': message}, bot)
+
+
+async def measure_startup(db_file: str, users: int) -> dict:
+    from lib.client import Client
+
+    start = time.perf_counter()
+    client = Client(TOKEN, os.path.relpath(db_file, ROOT_DIR))
+    client.setup_application()
+    application = client.application
+
+    first_update = asyncio.Event()
+
+    async def probe(update, context):
+        first_update.set()
+
+    application.add_handler(TypeHandler(Update, probe), group=-1)
+    setup_ms = (time.perf_counter() - start) * 1000
+
+    await application.initialize()
+    await application.start()
+    await application.update_queue.put(probe_update(application.bot))
+    await first_update.wait()
+    first_update_ms = (time.perf_counter() - start) * 1000
+
+    index = client.notification_index
+    while index.loading or len(index.user_slots) < users:
+        await asyncio.sleep(0.005)
+    index_ready_ms = (time.perf_counter() - start) * 1000
+
+    # what startup used to block on before serving updates
+    eager_start = time.perf_counter()
+    index.rebuild(client.backend.sync.get_all_active_users().answer)
+    eager_index_ms = (time.perf_counter() - eager_start) * 1000
+
+    await application.stop()
+    await application.shutdown()
+    client.backend.close()
+    client.render_pool.close()
+
+    return {
+        'users': users,
+        'setup_ms': round(setup_ms, 1),
+        'first_update_ms': round(first_update_ms, 1),
+        'index_ready_ms': round(index_ready_ms, 1),
+        'eager_index_ms': round(eager_index_ms, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    args = parser.parse_args()
+
+    server = start_fake_bot_api()
+    ut.config['ingestion']['base_url'] = f"http://127.0.0.1:{server.server_port}/bot"
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            db_file = os.path.join(directory, 'startup.db')
+            create_synthetic_db(db_file, args.users)
+            result = asyncio.run(measure_startup(db_file, args.users))
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"{result['users']} users: setup {result['setup_ms']} ms, first update {result['first_update_ms']} ms, "
+          f"index ready {result['index_ready_ms']} ms, eager index load {result['eager_index_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""timings of backend and report hot paths on a synthetic database, results are printed
+or saved as json, so numbers of two versions could be compared
+
+python -m benchmarks.suite [--users 10000] [--marks 1000000] [--days 60] [--db existing.db] [--json] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+import lib.utils as ut
+from benchmarks.synthetic import create_synthetic_db
+from configs.definitions import ROOT_DIR
+from lib.backend import Backend
+from lib.chart_builder import WeekDrawer, MonthDrawer
+from lib.scheduler import NotificationIndex
+from lib.trend import get_window_start
+
+
+def latency_summary(seconds: list[float]) -> dict:
+    ordered = sorted(seconds)
+    return {
+        'calls': len(ordered),
+        'p50_us': round(ordered[len(ordered) // 2] * 1e6, 1),
+        'p95_us': round(ordered[int(len(ordered) * 0.95)] * 1e6, 1),
+        'p99_us': round(ordered[int(len(ordered) * 0.99)] * 1e6, 1),
+        'mean_us': round(statistics.fmean(ordered) * 1e6, 1),
+    }
+
+
+def open_backend(db_file: str, durability: str = 'immediate') -> Backend:
+    mark_queue = dict(ut.config['mark_queue'], durability=durability)
+    return Backend(os.path.relpath(db_file, ROOT_DIR), mark_queue, ut.config['settings_cache_size'], ut.config['sqlite'])
+
+
+def bench_get_setups(db_file: str, users: int, calls: int) -> dict:
+    """latency of settings reads, cold - first read of every user, warm - read from settings cache"""
+    backend = open_backend(db_file)
+    telegram_ids = random.Random(0).sample(range(1, users + 1), min(calls, users))
+    result = {}
+    for phase in ('cold', 'warm'):
+        seconds = []
+        for telegram_id in telegram_ids:
+            start = time.perf_counter()
+            backend.get_setups(telegram_id)
+            seconds.append(time.perf_counter() - start)
+        result[phase] = latency_summary(seconds)
+    backend.close()
+    return result
+
+
+def bench_initialize_jobs(db_file: str, batch_size: int) -> dict:
+    """what load_notification_index does after start: pages of active users into the notification index"""
+    backend = open_backend(db_file)
+    index = NotificationIndex()
+    start = time.perf_counter()
+    index.begin_load()
+    for users in backend.iter_active_users(batch_size):
+        index.load_users(users)
+    index.finish_load()
+    seconds = time.perf_counter() - start
+    backend.close()
+    return {'users': len(index.user_slots), 'slots': len(index.slots), 'ms': round(seconds * 1000, 1)}
+
+
+def bench_report_fetch(db_file: str, end: datetime) -> dict:
+    """data of the weekly report: trend statistics of the window and marks of every user"""
+    backend = open_backend(db_file)
+    drawer = WeekDrawer()
+    start_time = end - timedelta(days=7)
+    start = time.perf_counter()
+    trends = backend.get_window_trend_stats(drawer.window, get_window_start(drawer.window, start_time.date())).answer
+    users = marks = 0
+    for _, mark_times, _ in backend.iter_report_marks(start_time, end):
+        users += 1
+        marks += len(mark_times)
+    seconds = time.perf_counter() - start
+    backend.close()
+    return {
+        'users': users,
+        'marks': marks,
+        'trend_rows': len(trends),
+        'ms': round(seconds * 1000, 1),
+        'marks_per_s': round(marks / seconds),
+    }
+
+
+def bench_draw(db_file: str, users: int, end: datetime, repeat: int) -> dict:
+    """ChartBuilder.draw of real arrays of one user, templates are warmed by the first chart"""
+    backend = open_backend(db_file)
+    result = {}
+    for drawer, days in ((WeekDrawer(**ut.config['charts']['week']), 7), (MonthDrawer(**ut.config['charts']['month']), 30)):
+        mark_times, marks = backend.get_mark_arrays(users // 2 or 1, end - timedelta(days=days), end).answer
+        drawer.draw(mark_times, marks + 1)
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chart = drawer.draw(mark_times, marks + 1)
+            seconds.append(time.perf_counter() - start)
+        result[type(drawer).__name__] = {
+            'marks': len(marks),
+            'bytes': len(chart.getvalue()),
+            'ms': round(statistics.median(seconds) * 1000, 2),
+        }
+    backend.close()
+    return result
+
+
+def bench_add_mark(db_file: str, users: int, calls: int) -> dict:
+    """add_mark throughput for every durability mode, batched mode includes the final flush"""
+    result = {}
+    rng = random.Random(0)
+    for durability in ('immediate', 'batched'):
+        backend = open_backend(db_file, durability)
+        start = time.perf_counter()
+        for _ in range(calls):
+            backend.add_mark(rng.randint(1, users), rng.randint(0, 4))
+        backend.close()
+        seconds = time.perf_counter() - start
+        result[durability] = {'calls': calls, 'ms': round(seconds * 1000, 1), 'per_s': round(calls / seconds)}
+    return result
+
+
+def run_suite(db_file: str, users: int, end: datetime, calls: int, repeat: int, batch_size: int) -> dict:
+    # add_mark writes marks, so it goes last and does not change what the other benchmarks read
+    return {
+        'get_setups': bench_get_setups(db_file, users, calls),
+        'initialize_jobs': bench_initialize_jobs(db_file, batch_size),
+        'report_fetch': bench_report_fetch(db_file, end),
+        'draw': bench_draw(db_file, users, end, repeat),
+        'add_mark': bench_add_mark(db_file, users, calls),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--marks', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--db', help='use an existing synthetic database instead of a temporary one, '
+                                     'it should be generated with the same --users and --days, '
+                                     'add_mark benchmark appends marks to it')
+    parser.add_argument('--calls', type=int, default=2000, help='calls of add_mark and get_setups')
+    parser.add_argument('--repeat', type=int, default=10, help='charts drawn by every drawer')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    parser.add_argument('--output', help='also save json results to this file')
+    args = parser.parse_args()
+
+    end = datetime.now()
+    batch_size = ut.config['startup']['user_batch_size']
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = args.db
+        generation = {}
+        if db_file is None:
+            db_file = os.path.join(directory, 'benchmark.db')
+            generation = create_synthetic_db(db_file, args.users, args.marks, args.days, end)
+        results = run_suite(db_file, args.users, end, args.calls, args.repeat, batch_size)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'scale': {'users': args.users, 'marks': args.marks, 'days': args.days, 'db': args.db},
+        'generation': generation,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for name, result in results.items():
+        print(f"{name:16} {json.dumps(result)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""synthetic users and marks in a sqlite file with the bot schema
+
+python -m benchmarks.synthetic path/to.db [--users 100000] [--marks 50000000] [--days 60]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from sqlalchemy import insert
+
+import lib.utils as ut
+from db import migrations
+from db.engine import create_writer_engine
+from db.rollup import backfill_daily_rollup, backfill_trend_stats
+from db.tables import Base, User
+
+# marks are generated and inserted by chunks, so 50M marks do not have to fit in memory
+MARK_CHUNK = 1_000_000
+
+# mark_time is stored in the same text format as sqlalchemy DateTime uses
+MARK_INSERT = (
+    "INSERT INTO mark (telegram_id, mark, mark_time) "
+    "VALUES (?, ?, strftime('%Y-%m-%d %H:%M:%S', ?, 'unixepoch') || '.000000')"
+)
+
+
+def user_rows(users: int, seed: int = 0) -> list[dict]:
+    """active users with ids 1..users and settings within the 6-21 hours range"""
+    rng = np.random.default_rng(seed)
+    start_hours = rng.integers(6, 12, users)
+    frequencies = rng.integers(1, 4, users)
+    minutes = rng.integers(0, 12, users) * 5
+    return [
+        {
+            'telegram_id': telegram_id,
+            'frequency': int(frequency),
+            'start_hour': int(start_hour),
+            'end_hour': int(start_hour) + 10,
+            'minute': int(minute),
+            'active_flag': True,
+        }
+        for telegram_id, (start_hour, frequency, minute) in enumerate(zip(start_hours, frequencies, minutes), start=1)
+    ]
+
+
+def insert_marks(connection, users: int, marks: int, days: int, end: datetime, seed: int = 0) -> None:
+    """uniformly distributed marks of users 1..users over `days` days before end"""
+    rng = np.random.default_rng(seed + 1)
+    # mark times are naive local datetimes, strftime of sqlite keeps them as is when they are treated as utc
+    end_epoch = int(end.replace(tzinfo=timezone.utc).timestamp())
+    cursor = connection.cursor()
+    # generated data could always be generated again
+    cursor.execute("PRAGMA synchronous = OFF")
+    for offset in range(0, marks, MARK_CHUNK):
+        size = min(MARK_CHUNK, marks - offset)
+        telegram_ids = rng.integers(1, users + 1, size)
+        mark_values = rng.integers(0, 5, size)
+        epochs = end_epoch - rng.integers(0, days * 86400, size)
+        cursor.executemany(MARK_INSERT, zip(telegram_ids.tolist(), mark_values.tolist(), epochs.tolist()))
+    cursor.close()
+
+
+def create_synthetic_db(db_file: str, users: int, marks: int = 0, days: int = 60,
+                        end: datetime | None = None, seed: int = 0) -> dict:
+    """create schema, users, marks and their rollups, returns seconds spent on every step"""
+    timings = {}
+    engine = create_writer_engine(db_file, ut.config['sqlite']['pragmas'])
+    migrations.upgrade(engine, Base.metadata)
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(insert(User), user_rows(users, seed))
+    timings['users_s'] = time.perf_counter() - start
+
+    if marks:
+        start = time.perf_counter()
+        connection = engine.raw_connection()
+        try:
+            insert_marks(connection, users, marks, days, end or datetime.now(), seed)
+            connection.commit()
+        finally:
+            connection.close()
+        timings['marks_s'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            backfill_daily_rollup(connection)
+            backfill_trend_stats(connection)
+        timings['rollups_s'] = time.perf_counter() - start
+
+    engine.dispose()
+    return {name: round(seconds, 2) for name, seconds in timings.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('db_file')
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--marks', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db_file):
+        sys.exit(f"{args.db_file} already exists")
+    timings = create_synthetic_db(args.db_file, args.users, args.marks, args.days, seed=args.seed)
+    print(f"{args.users} users and {args.marks} marks were generated: {timings}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""notification tick while its broadcast takes longer than the tick interval, bot api is replaced
+by a slow local fake server; every tick should return at once, every due user should get exactly
+one message and a minute missed by the job queue should be caught up by the next tick,
+exit code is not zero otherwise, could be used in CI
+
+python -m benchmarks.tick_overrun [--users 300] [--rate 100] [--send-ms 20] [--interval 1] [--json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+import lib.utils as ut
+from benchmarks.startup import TOKEN, FakeBotApi
+from benchmarks.synthetic import create_synthetic_db
+from configs.definitions import ROOT_DIR
+from lib.broadcaster import Broadcaster
+from lib.scheduler import NotificationIndex, round_to_minute, utc_minute_of_day
+from lib.settings_cache import UserSettings
+
+
+class SlowBotApi(FakeBotApi):
+    """fake bot api which answers sendMessage after send_seconds and counts messages of every chat"""
+    send_seconds = 0.
+    sent = Counter()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        if self.path.endswith('/sendMessage'):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+            chat_id = json.loads(body)['chat_id'] if body.startswith('{') else parse_qs(body)['chat_id'][0]
+            time.sleep(self.send_seconds)
+            with self.lock:
+                self.sent[int(chat_id)] += 1
+            message = {'message_id': 1, 'date': int(time.time()), 'chat': {'id': int(chat_id), 'type': 'private'}}
+            return self.answer(message)
+        return super().do_POST()
+
+    def answer(self, result):
+        body = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SkippedRuns(logging.Handler):
+    """collects job queue warnings about runs skipped because the previous one is still running"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        message = record.getMessage()
+        if 'maximum number of running instances reached' in message or 'was missed by' in message:
+            self.messages.append(message)
+
+
+def check_catch_up() -> dict:
+    """minutes between two ticks are handed out by the second one, minutes which pass
+    while the index is loaded are handed out by the first tick after loading"""
+    start = datetime(2024, 1, 1, 9, 0, tzinfo=timezone.utc)
+    users = [UserSettings(telegram_id, 1, 9, 9, minute, True, 'UTC') for telegram_id, minute in enumerate(range(4), 1)]
+
+    index = NotificationIndex()
+    for settings in users:
+        index.add_user(settings)
+    first = index.take_due(start)
+    # the job queue skipped 09:01 and 09:02
+    second = index.take_due(start + timedelta(minutes=3))
+    repeated = index.take_due(start + timedelta(minutes=3, seconds=10))
+
+    index = NotificationIndex()
+    index.begin_load(start)
+    while_loading = index.take_due(start + timedelta(minutes=1))
+    index.load_users(users)
+    index.finish_load()
+    after_loading = index.take_due(start + timedelta(minutes=2))
+
+    return {
+        'first': sorted(first),
+        'caught_up': sorted(second),
+        'repeated': sorted(repeated),
+        'while_loading': sorted(while_loading),
+        'after_loading': sorted(after_loading),
+        'ok': (
+            sorted(first) == [540] and sorted(second) == [541, 542, 543] and not repeated
+            and not while_loading and sorted(after_loading) == [540, 541, 542]
+        ),
+    }
+
+
+async def measure_overrun(db_file: str, users: int, rate: float, interval: float) -> dict:
+    from lib.client import Client
+
+    client = Client(TOKEN, os.path.relpath(db_file, ROOT_DIR))
+    client.broadcaster = Broadcaster(concurrency=20, rate=rate)
+    application = client.application
+
+    # every user is due in the current minute
+    now = round_to_minute(datetime.now(timezone.utc))
+    minute_of_day = utc_minute_of_day(now)
+    client.notification_index.rebuild([
+        UserSettings(telegram_id, 1, minute_of_day // 60, minute_of_day // 60, minute_of_day % 60, True, 'UTC')
+        for telegram_id in range(1, users + 1)
+    ])
+    # the first tick could already round to the next minute, this one is caught up then
+    client.notification_index.last_minute = now - timedelta(minutes=1)
+
+    tick_seconds = []
+
+    async def timed_tick(context):
+        start = time.perf_counter()
+        await client.notification_tick(context)
+        tick_seconds.append(time.perf_counter() - start)
+
+    skipped = SkippedRuns()
+    logging.getLogger('apscheduler').addHandler(skipped)
+
+    await application.initialize()
+    await application.start()
+    application.job_queue.run_repeating(timed_tick, interval=interval, first=0, name='notification_tick')
+
+    start = time.perf_counter()
+    expected_seconds = users / rate
+    while sum(SlowBotApi.sent.values()) < users and time.perf_counter() - start < 5 * expected_seconds + 10:
+        await asyncio.sleep(0.05)
+    broadcast_seconds = time.perf_counter() - start
+    # a few more ticks, none of them should send again
+    await asyncio.sleep(3 * interval)
+
+    await application.stop()
+    await application.shutdown()
+    logging.getLogger('apscheduler').removeHandler(skipped)
+    client.backend.close()
+    client.render_pool.close()
+
+    return {
+        'users': users,
+        'interval_s': interval,
+        'broadcast_s': round(broadcast_seconds, 2),
+        'ticks': len(tick_seconds),
+        'max_tick_ms': round(max(tick_seconds, default=0) * 1000, 1),
+        'notified': len(SlowBotApi.sent),
+        'duplicates': sum(count - 1 for count in SlowBotApi.sent.values()),
+        'skipped_runs': skipped.messages,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--rate', type=float, default=100, help='messages per second of the broadcaster')
+    parser.add_argument('--send-ms', type=float, default=20, help='answer delay of the fake sendMessage')
+    parser.add_argument('--interval', type=float, default=1, help='tick interval in seconds')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    args = parser.parse_args()
+
+    SlowBotApi.send_seconds = args.send_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowBotApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ut.config['ingestion']['base_url'] = f"http://127.0.0.1:{server.server_port}/bot"
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            db_file = os.path.join(directory, 'tick.db')
+            create_synthetic_db(db_file, 0)
+            overrun = asyncio.run(measure_overrun(db_file, args.users, args.rate, args.interval))
+    finally:
+        server.shutdown()
+    catch_up = check_catch_up()
+
+    ok = (
+        catch_up['ok']
+        and overrun['broadcast_s'] > args.interval
+        and overrun['max_tick_ms'] < args.interval * 1000 / 2
+        and overrun['notified'] == args.users
+        and not overrun['duplicates']
+        and not overrun['skipped_runs']
+    )
+    result = {'overrun': overrun, 'catch_up': catch_up, 'ok': ok}
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{overrun['users']} users in {overrun['broadcast_s']} s with {overrun['interval_s']} s interval: "
+              f"{overrun['ticks']} ticks, longest {overrun['max_tick_ms']} ms, notified {overrun['notified']}, "
+              f"duplicates {overrun['duplicates']}, skipped runs {len(overrun['skipped_runs'])}")
+        print(f"catch up: first tick {catch_up['first']}, after two missed minutes {catch_up['caught_up']}, "
+              f"same minute again {catch_up['repeated']}, while loading {catch_up['while_loading']}, "
+              f"after loading {catch_up['after_loading']}")
+        print('ok' if ok else 'failed')
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
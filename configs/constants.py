@@ -7,6 +7,10 @@ load_dotenv()
 
 TZ = 'Europe/Helsinki'
 API_TOKEN = os.getenv("MOOD_PSY_BOT_TOKEN", 'aaa')
+# comma separated telegram ids of users who can see admin statistics
+ADMIN_IDS = {int(admin_id) for admin_id in os.getenv("MOOD_PSY_BOT_ADMIN_IDS", '').split(',') if admin_id.strip()}
+# checked against X-Telegram-Bot-Api-Secret-Token header in webhook mode
+WEBHOOK_SECRET = os.getenv("MOOD_PSY_BOT_WEBHOOK_SECRET")
 
 
 tz = pytz.timezone(TZ)
@@ -0,0 +1,52 @@
+import os
+import sys
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+# pragmas which make sense only for connections which write
+WRITER_PRAGMAS = ('journal_mode', 'synchronous')
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+}
+
+
+def apply_pragmas(engine: Engine, pragmas: dict) -> None:
+    """execute pragmas on every new dbapi connection of engine"""
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def create_writer_engine(db_file: str, pragmas: dict | None = None) -> Engine:
+    """engine with one connection, sqlite allows only one writer at a time anyway"""
+    engine = create_engine(
+        f"sqlite:///{db_file}",
+        echo=False,
+        pool_size=1,
+        max_overflow=0,
+        connect_args={"check_same_thread": False},
+    )
+    apply_pragmas(engine, DEFAULT_PRAGMAS if pragmas is None else pragmas)
+    return engine
+
+
+def create_reader_engine(db_file: str, pragmas: dict | None = None, pool_size: int = 4) -> Engine:
+    """pooled read-only engine, in WAL mode its long scans do not block the writer"""
+    pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+    engine = create_engine(
+        f"sqlite:///file:{db_file}?mode=ro&uri=true",
+        echo=False,
+        pool_size=pool_size,
+        max_overflow=0,
+        connect_args={"check_same_thread": False},
+    )
+    apply_pragmas(engine, {name: value for name, value in pragmas.items() if name not in WRITER_PRAGMAS})
+    return engine
@@ -0,0 +1,137 @@
+import os
+import sys
+import logging
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, description: str):
+    """register function as schema migration, versions should go one by one"""
+    def decorator(func):
+        MIGRATIONS.append(Migration(version, description, func))
+        MIGRATIONS.sort(key=lambda item: item.version)
+        return func
+    return decorator
+
+
+def get_version(connection: Connection) -> int:
+    return connection.execute(text("PRAGMA user_version")).scalar()
+
+
+def set_version(connection: Connection, version: int) -> None:
+    connection.execute(text(f"PRAGMA user_version = {int(version)}"))
+
+
+def head_version() -> int:
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def add_column(connection: Connection, table: str, column_ddl: str) -> None:
+    """add column if table does not have it yet, column_ddl is like 'timezone VARCHAR'"""
+    column_name = column_ddl.split()[0]
+    columns = [column['name'] for column in inspect(connection).get_columns(table)]
+    if column_name not in columns:
+        connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column_ddl}'))
+
+
+def create_index(connection: Connection, name: str, table: str, columns: list[str]) -> None:
+    columns_ddl = ', '.join(columns)
+    connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({columns_ddl})'))
+
+
+def upgrade(engine: Engine, metadata) -> int:
+    """create missing tables and apply pending migrations in place, returns schema version
+
+    fresh database is created from the models and stamped with the head version,
+    existing database gets all migrations newer than its PRAGMA user_version
+    """
+    fresh = not inspect(engine).get_table_names()
+    metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        if fresh:
+            set_version(connection, head_version())
+            logger.info(f"schema was created with version {head_version()}")
+            return head_version()
+        version = get_version(connection)
+
+    for item in MIGRATIONS:
+        if item.version <= version:
+            continue
+        with engine.begin() as connection:
+            item.upgrade(connection)
+            set_version(connection, item.version)
+        version = item.version
+        logger.info(f"migration {item.version} '{item.description}' was applied")
+
+    return version
+
+
+@migration(1, 'mark ids are assigned by database')
+def _mark_autoincrement_ids(connection: Connection) -> None:
+    # mark.id is declared as INTEGER PRIMARY KEY so it is already an alias of sqlite rowid,
+    # existing ids are kept and new ones are assigned on insert, no DDL is needed
+    pass
+
+
+@migration(2, 'indexes for mark and active user lookups')
+def _lookup_indexes(connection: Connection) -> None:
+    create_index(connection, 'ix_mark_telegram_id_mark_time', 'mark', ['telegram_id', 'mark_time', 'mark'])
+    create_index(connection, 'ix_mark_mark_time_telegram_id', 'mark', ['mark_time', 'telegram_id'])
+    create_index(connection, 'ix_user_active_flag', 'user', ['active_flag'])
+
+
+
+@migration(3, 'daily mark rollup table')
+def _daily_rollup(connection: Connection) -> None:
+    from db.tables import MarkDailyRollup
+    from db.rollup import backfill_daily_rollup
+
+    MarkDailyRollup.__table__.create(connection, checkfirst=True)
+    backfill_daily_rollup(connection)
+
+
+
+@migration(4, 'trend statistics table')
+def _trend_stats(connection: Connection) -> None:
+    from db.tables import MarkTrendStats
+    from db.rollup import backfill_trend_stats
+
+    MarkTrendStats.__table__.create(connection, checkfirst=True)
+    backfill_trend_stats(connection)
+
+
+
+@migration(5, 'telegram persistence tables')
+def _persistence(connection: Connection) -> None:
+    from db.tables import PersistedUserData, PersistedConversation
+
+    PersistedUserData.__table__.create(connection, checkfirst=True)
+    PersistedConversation.__table__.create(connection, checkfirst=True)
+
+
+
+@migration(6, 'user timezone')
+def _user_timezone(connection: Connection) -> None:
+    add_column(connection, 'user', 'timezone VARCHAR')
+
+
+if __name__ == '__main__':
+    from db.tables import initialize_bd
+    print(f"schema version: {initialize_bd()}")
@@ -0,0 +1,57 @@
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import create_engine
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from configs.definitions import ROOT_DIR
+from lib.backend import MarkProcessor, UserProcessor
+import lib.utils as ut
+
+
+def hot_queries() -> dict:
+    """queries which must be served by indexes"""
+    date_start, date_end = datetime(2023, 1, 1), datetime(2023, 1, 8)
+    return {
+        'marks_for_user': MarkProcessor.marks_for_user_query(1, date_start, date_end),
+        'users_with_activity': MarkProcessor.users_with_activity_query(date_start, date_end),
+        'report_marks': MarkProcessor.report_marks_query(date_start, date_end),
+        'report_marks_page': MarkProcessor.report_marks_query(date_start, date_end, list(range(1, 501))),
+        'active_users': UserProcessor.active_users_query(),
+    }
+
+
+def explain(connection, stmt) -> list[str]:
+    # expanding IN parameters are rendered as one placeholder per value
+    compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    params = []
+    for name in compiled.positiontup:
+        value = compiled.params[name]
+        params.append(str(value) if isinstance(value, datetime) else value)
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", tuple(params)).all()
+    return [row[3] for row in rows]
+
+
+def check_query_plans(engine) -> dict[str, list[str]]:
+    """returns plans of hot queries which regressed to full table scan"""
+    regressions = {}
+    with engine.connect() as connection:
+        for name, stmt in hot_queries().items():
+            plan = explain(connection, stmt)
+            if any(step.startswith('SCAN') and 'CONSTANT ROW' not in step for step in plan):
+                regressions[name] = plan
+    return regressions
+
+
+if __name__ == '__main__':
+    # exit code is not zero if any hot query does table scan, could be used in CI
+    if len(sys.argv) > 1:
+        db_uri = f"sqlite:///{sys.argv[1]}"
+    else:
+        db_uri = f"sqlite:///{ROOT_DIR}/{ut.config['bd_directory']}{ut.config['bd_name']}"
+
+    regressions = check_query_plans(create_engine(db_uri))
+    for name, plan in regressions.items():
+        print(f"{name}: {plan}")
+    sys.exit(1 if regressions else 0)
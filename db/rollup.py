@@ -0,0 +1,171 @@
+"""daily rollups and trend statistics of marks
+
+days and week/month windows are server-local calendar days (configs.constants.TZ), not days in
+the timezone of the user: mark_time is stored as server-local wall clock and user timezones only
+move notification slots (lib.scheduler). A mark made near midnight by a user of another timezone
+falls on the server day, reports and anything reading mark_daily_rollup or mark_trend_stats
+should treat the day as a server day
+"""
+import os
+import sys
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from db.tables import Mark, MarkDailyRollup, MarkTrendStats
+from lib.trend import WINDOWS, get_window_start, days_since
+
+
+def aggregate_marks(rows: list[dict]) -> list[dict]:
+    """fold mark rows into one rollup row per user per server-local day"""
+    rollups = {}
+    for row in rows:
+        mark = row['mark']
+        mark_time = row['mark_time']
+        key = (row['telegram_id'], mark_time.date())
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollups[key] = {
+                'telegram_id': key[0],
+                'day': key[1],
+                'mark_count': 1,
+                'mark_sum': mark,
+                'mark_sum_sq': mark * mark,
+                'mark_min': mark,
+                'mark_max': mark,
+                'first_time': mark_time,
+                'last_time': mark_time,
+            }
+            continue
+        rollup['mark_count'] += 1
+        rollup['mark_sum'] += mark
+        rollup['mark_sum_sq'] += mark * mark
+        rollup['mark_min'] = min(rollup['mark_min'], mark)
+        rollup['mark_max'] = max(rollup['mark_max'], mark)
+        rollup['first_time'] = min(rollup['first_time'], mark_time)
+        rollup['last_time'] = max(rollup['last_time'], mark_time)
+
+    return list(rollups.values())
+
+
+def rollup_upsert(rollups: list[dict]):
+    """statement which merges rollup rows into mark_daily_rollup"""
+    stmt = sqlite_insert(MarkDailyRollup).values(rollups)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MarkDailyRollup.telegram_id, MarkDailyRollup.day],
+        set_={
+            'mark_count': MarkDailyRollup.mark_count + excluded.mark_count,
+            'mark_sum': MarkDailyRollup.mark_sum + excluded.mark_sum,
+            'mark_sum_sq': MarkDailyRollup.mark_sum_sq + excluded.mark_sum_sq,
+            'mark_min': func.min(MarkDailyRollup.mark_min, excluded.mark_min),
+            'mark_max': func.max(MarkDailyRollup.mark_max, excluded.mark_max),
+            'first_time': func.min(MarkDailyRollup.first_time, excluded.first_time),
+            'last_time': func.max(MarkDailyRollup.last_time, excluded.last_time),
+        },
+    )
+    return stmt
+
+
+def aggregate_trends(rows: list[dict]) -> list[dict]:
+    """fold mark rows into trend statistics per user per window"""
+    trends = {}
+    for row in rows:
+        y = row['mark']
+        for window in WINDOWS:
+            window_start = get_window_start(window, row['mark_time'].date())
+            x = days_since(window_start, row['mark_time'])
+            key = (row['telegram_id'], window, window_start)
+            trend = trends.setdefault(key, {
+                'telegram_id': key[0],
+                'window': window,
+                'window_start': window_start,
+                'n': 0,
+                'sum_x': 0.,
+                'sum_y': 0.,
+                'sum_xy': 0.,
+                'sum_xx': 0.,
+            })
+            trend['n'] += 1
+            trend['sum_x'] += x
+            trend['sum_y'] += y
+            trend['sum_xy'] += x * y
+            trend['sum_xx'] += x * x
+
+    return list(trends.values())
+
+
+def trend_upsert(trends: list[dict]):
+    stmt = sqlite_insert(MarkTrendStats).values(trends)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MarkTrendStats.telegram_id, MarkTrendStats.window, MarkTrendStats.window_start],
+        set_={
+            column: getattr(MarkTrendStats, column) + getattr(excluded, column)
+            for column in ('n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx')
+        },
+    )
+    return stmt
+
+
+def backfill_daily_rollup(connection: Connection) -> int:
+    """rebuild mark_daily_rollup from all marks with one INSERT ... SELECT, returns number of rows"""
+    day = func.date(Mark.mark_time)
+    stmt = select(
+        Mark.telegram_id,
+        day,
+        func.count(),
+        func.sum(Mark.mark),
+        func.sum(Mark.mark * Mark.mark),
+        func.min(Mark.mark),
+        func.max(Mark.mark),
+        func.min(Mark.mark_time),
+        func.max(Mark.mark_time),
+    ).group_by(Mark.telegram_id, day)
+
+    columns = ['telegram_id', 'day', 'mark_count', 'mark_sum', 'mark_sum_sq',
+               'mark_min', 'mark_max', 'first_time', 'last_time']
+    connection.execute(delete(MarkDailyRollup))
+    result = connection.execute(insert(MarkDailyRollup).from_select(columns, stmt))
+    return result.rowcount
+
+
+def backfill_trend_stats(connection: Connection) -> int:
+    """rebuild mark_trend_stats from all marks, returns number of rows"""
+    window_starts = {
+        'week': func.date(Mark.mark_time, 'weekday 0', '-6 days'),
+        'month': func.date(Mark.mark_time, 'start of month'),
+    }
+    columns = ['telegram_id', 'window', 'window_start', 'n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx']
+
+    connection.execute(delete(MarkTrendStats))
+    rowcount = 0
+    for window, window_start in window_starts.items():
+        x = func.julianday(Mark.mark_time) - func.julianday(window_start)
+        stmt = select(
+            Mark.telegram_id,
+            literal(window),
+            window_start,
+            func.count(),
+            func.sum(x),
+            func.sum(Mark.mark),
+            func.sum(x * Mark.mark),
+            func.sum(x * x),
+        ).group_by(Mark.telegram_id, window_start)
+        rowcount += connection.execute(insert(MarkTrendStats).from_select(columns, stmt)).rowcount
+
+    return rowcount
+
+
+if __name__ == '__main__':
+    from configs.definitions import ROOT_DIR
+    from db.engine import create_writer_engine
+    import lib.utils as ut
+
+    engine = create_writer_engine(f"{ROOT_DIR}/{ut.config['bd_directory']}{ut.config['bd_name']}",
+                                  ut.config['sqlite']['pragmas'])
+    with engine.begin() as connection:
+        print(f"{backfill_daily_rollup(connection)} daily rollups were written")
+        print(f"{backfill_trend_stats(connection)} trend stats were written")
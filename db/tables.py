@@ -1,12 +1,13 @@
 import os
 import sys
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, BOOLEAN
-from sqlalchemy_utils import database_exists, create_database
+from sqlalchemy import Column, Integer, String, DateTime, Date, Float, BOOLEAN, Index
 from sqlalchemy.ext.declarative import declarative_base
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
 
 from configs.definitions import ROOT_DIR
+from db import migrations
+from db.engine import create_writer_engine
 import lib.utils as ut
 
 Base = declarative_base()
@@ -15,7 +16,12 @@ Base = declarative_base()
 class Mark(Base):
 
     __tablename__ = 'mark'
-    id = Column(Integer, primary_key=True)
+    __table_args__ = (
+        # mark column is included so marks for user are read from index only
+        Index('ix_mark_telegram_id_mark_time', 'telegram_id', 'mark_time', 'mark'),
+        Index('ix_mark_mark_time_telegram_id', 'mark_time', 'telegram_id'),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
     telegram_id = Column(Integer)
     mark = Column(Integer)
     mark_time = Column(DateTime)
@@ -24,29 +30,82 @@ class Mark(Base):
 class User(Base):
 
     __tablename__ = 'user'
+    __table_args__ = (
+        Index('ix_user_active_flag', 'active_flag'),
+    )
     telegram_id = Column(Integer, primary_key=True)
     frequency = Column(Integer)
     start_hour = Column(Integer)
     end_hour = Column(Integer)
     minute = Column(Integer)
     active_flag = Column(BOOLEAN)
+    # IANA name like Europe/Helsinki, NULL means configs.constants.TZ
+    timezone = Column(String)
 
-def initialize_bd() -> None:
 
-    CONFIG_PATH = ROOT_DIR + '/configs/config.yaml'
-    config = ut.read_config(CONFIG_PATH)
+class MarkDailyRollup(Base):
+    """aggregates of marks per user per server-local day (not the day in user timezone, see db.rollup),
+    maintained together with mark inserts"""
+
+    __tablename__ = 'mark_daily_rollup'
+    telegram_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    mark_count = Column(Integer)
+    mark_sum = Column(Integer)
+    mark_sum_sq = Column(Integer)
+    mark_min = Column(Integer)
+    mark_max = Column(Integer)
+    first_time = Column(DateTime)
+    last_time = Column(DateTime)
+
+
+class MarkTrendStats(Base):
+    """sufficient statistics of linear trend of marks per user per week or month,
+    x is number of days since window_start, y is mark, windows are server-local (see db.rollup)"""
+
+    __tablename__ = 'mark_trend_stats'
+    telegram_id = Column(Integer, primary_key=True)
+    window = Column(String, primary_key=True)
+    window_start = Column(Date, primary_key=True)
+    n = Column(Integer)
+    sum_x = Column(Float)
+    sum_y = Column(Float)
+    sum_xy = Column(Float)
+    sum_xx = Column(Float)
+
+class PersistedUserData(Base):
+    """context.user_data of telegram application, data is json"""
+
+    __tablename__ = 'persisted_user_data'
+    telegram_id = Column(Integer, primary_key=True)
+    data = Column(String)
+
+
+class PersistedConversation(Base):
+    """states of persistent conversation handlers, key is json list of chat and user ids"""
+
+    __tablename__ = 'persisted_conversation'
+    name = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    state = Column(Integer)
+
+
+def initialize_bd() -> int:
+    from sqlalchemy_utils import database_exists, create_database
+
+    config = ut.config
     bd_directory = config['bd_directory']
     bd_name = config['bd_name']
 
     if not os.path.exists(f"{ROOT_DIR}/{bd_directory}"):
         os.makedirs(f"{ROOT_DIR}/{bd_directory}")
 
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{ROOT_DIR}/{bd_directory}{bd_name}"
-
-    engine = create_engine(SQLALCHEMY_DATABASE_URI, echo=False)
+    engine = create_writer_engine(f"{ROOT_DIR}/{bd_directory}{bd_name}", config['sqlite']['pragmas'])
     if not database_exists(engine.url):
         create_database(engine.url)
-    Base.metadata.create_all(engine)
 
-    return
+    version = migrations.upgrade(engine, Base.metadata)
+    engine.dispose()
+
+    return version
 
@@ -1,5 +1,6 @@
 import logging
 import datetime
+import os
 
 # clear handlers
 root_logger = logging.root
@@ -17,14 +18,22 @@ logging.Formatter.formatTime = (
 	lambda self, record, datefmt=None: datetime.datetime.fromtimestamp(record.created)
 )
 
+# logs are truncated once by the bot process and opened for append by every process,
+# processes started by multiprocessing (forkserver, chart render workers) import lib again
+# and inherit the variable, so they do not truncate the logs of the bot
+if not os.environ.get('MOOD_PSY_BOT_LOGGING'):
+    os.environ['MOOD_PSY_BOT_LOGGING'] = '1'
+    for log_file in ('stdout_mood_psy_bot.log', 'stderr_mood_psy_bot.log'):
+        open(log_file, 'w').close()
+
 # add stdout handler
 # stdout_handler = logging.StreamHandler(sys.stdout)
-stdout_handler = logging.FileHandler('stdout_mood_psy_bot.log', mode='w')
+stdout_handler = logging.FileHandler('stdout_mood_psy_bot.log', mode='a')
 stdout_handler.addFilter(lambda entry: entry.levelno <= logging.INFO)
 stdout_handler.setFormatter(formatter)
 root_module_logger.addHandler(stdout_handler)
 
-stderr_handler = logging.FileHandler('stderr_mood_psy_bot.log', mode='w')
+stderr_handler = logging.FileHandler('stderr_mood_psy_bot.log', mode='a')
 stderr_handler.addFilter(lambda entry: entry.levelno > logging.INFO)
 stderr_handler.setFormatter(formatter)
 root_module_logger.addHandler(stderr_handler)
@@ -0,0 +1,190 @@
+import argparse
+import datetime as dt
+import itertools
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import Integer, cast, func, select
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from db.tables import Mark, User
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MARKS_NUMBER = 5
+
+
+def epoch_seconds(column):
+    """datetime column as integer seconds, sqlite stores local wall clock so result is local too"""
+    return cast(func.strftime('%s', column), Integer)
+
+
+def rows_to_array(rows, columns_number: int) -> np.ndarray:
+    """integer rows to int64 matrix, fromiter over flat values is an order of magnitude
+    faster than np.array over list of rows"""
+    flat = itertools.chain.from_iterable(rows)
+    return np.fromiter(flat, dtype=np.int64, count=columns_number * len(rows)).reshape(-1, columns_number)
+
+
+def fetch_columns(connection, stmt, columns_number: int, chunk_size: int) -> np.ndarray:
+    """read result in chunks straight into int64 matrix, no orm objects are created"""
+    result = connection.execution_options(yield_per=chunk_size).execute(stmt)
+    chunks = [rows_to_array(part, columns_number) for part in result.partitions()]
+    if not chunks:
+        return np.empty((0, columns_number), dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+@dataclass
+class MarkColumns:
+    telegram_id: np.ndarray
+    mark: np.ndarray
+    mark_time: np.ndarray  # seconds since epoch of local time
+
+    @classmethod
+    def load(cls, engine, date_start: dt.datetime, date_end: dt.datetime, chunk_size: int = 100_000) -> "MarkColumns":
+        stmt = select(Mark.telegram_id, Mark.mark, epoch_seconds(Mark.mark_time))\
+                .where(Mark.mark_time>=date_start)\
+                .where(Mark.mark_time<=date_end)
+        with engine.connect() as connection:
+            data = fetch_columns(connection, stmt, 3, chunk_size)
+        return cls(data[:, 0], data[:, 1].astype(np.int8), data[:, 2])
+
+
+@dataclass
+class UserColumns:
+    telegram_id: np.ndarray
+    active_flag: np.ndarray
+    notifications_per_day: np.ndarray
+
+    @classmethod
+    def load(cls, engine, chunk_size: int = 100_000) -> "UserColumns":
+        # users without schedule have zero notifications
+        stmt = select(
+            User.telegram_id,
+            func.coalesce(User.active_flag, 0),
+            func.coalesce(User.start_hour, 0),
+            func.coalesce(User.end_hour, -1),
+            func.coalesce(User.frequency, 1),
+        ).order_by(User.telegram_id)
+        with engine.connect() as connection:
+            data = fetch_columns(connection, stmt, 5, chunk_size)
+        start_hour, end_hour, frequency = data[:, 2], data[:, 3], np.maximum(data[:, 4], 1)
+        notifications_per_day = np.where(end_hour >= start_hour, (end_hour - start_hour) // frequency + 1, 0)
+        return cls(data[:, 0], data[:, 1].astype(bool), notifications_per_day)
+
+
+@dataclass
+class AnalyticsReport:
+    date_start: dt.datetime
+    date_end: dt.datetime
+    users: int
+    active_users: int
+    users_with_marks: int
+    marks: int
+    response_rate: float
+    mark_distribution: np.ndarray  # number of marks of every value
+    marks_by_hour: np.ndarray
+    mean_mark_by_hour: np.ndarray
+    marks_by_weekday: np.ndarray
+    mean_mark_by_weekday: np.ndarray
+    user_mean_mark_quantiles: np.ndarray  # 10%, 50%, 90% of mean mark of user
+
+
+def _grouped_mean(groups: np.ndarray, values: np.ndarray, groups_number: int) -> tuple[np.ndarray, np.ndarray]:
+    counts = np.bincount(groups, minlength=groups_number)
+    sums = np.bincount(groups, weights=values, minlength=groups_number)
+    means = np.divide(sums, counts, out=np.full(groups_number, np.nan), where=counts > 0)
+    return counts, means
+
+
+def compute_analytics(marks: MarkColumns, users: UserColumns,
+                      date_start: dt.datetime, date_end: dt.datetime) -> AnalyticsReport:
+    # per user aggregates with one sort and np.add.reduceat over user boundaries
+    order = np.argsort(marks.telegram_id, kind='stable')
+    sorted_ids = marks.telegram_id[order]
+    sorted_marks = marks.mark[order].astype(np.int64)
+    if len(sorted_ids):
+        boundaries = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        user_ids = sorted_ids[boundaries]
+        user_counts = np.diff(np.r_[boundaries, len(sorted_ids)])
+        user_means = np.add.reduceat(sorted_marks, boundaries) / user_counts
+        user_mean_mark_quantiles = np.quantile(user_means, [0.1, 0.5, 0.9])
+    else:
+        user_ids = np.empty(0, dtype=np.int64)
+        user_counts = np.empty(0, dtype=np.int64)
+        user_mean_mark_quantiles = np.full(3, np.nan)
+
+    # response rate of active users - marks divided by sent notifications
+    days = max((date_end - date_start).total_seconds() / 86400, 1)
+    active_ids = users.telegram_id[users.active_flag]
+    expected = users.notifications_per_day[users.active_flag].sum() * days
+    is_active = np.isin(user_ids, active_ids)
+    response_rate = user_counts[is_active].sum() / expected if expected else np.nan
+
+    hours = (marks.mark_time // 3600) % 24
+    # 1970-01-01 was thursday
+    weekdays = (marks.mark_time // 86400 + 3) % 7
+    marks_by_hour, mean_mark_by_hour = _grouped_mean(hours, marks.mark, 24)
+    marks_by_weekday, mean_mark_by_weekday = _grouped_mean(weekdays, marks.mark, 7)
+
+    return AnalyticsReport(
+        date_start=date_start,
+        date_end=date_end,
+        users=len(users.telegram_id),
+        active_users=len(active_ids),
+        users_with_marks=len(user_ids),
+        marks=len(marks.mark),
+        response_rate=float(response_rate),
+        mark_distribution=np.bincount(marks.mark, minlength=MARKS_NUMBER),
+        marks_by_hour=marks_by_hour,
+        mean_mark_by_hour=mean_mark_by_hour,
+        marks_by_weekday=marks_by_weekday,
+        mean_mark_by_weekday=mean_mark_by_weekday,
+        user_mean_mark_quantiles=user_mean_mark_quantiles,
+    )
+
+
+def build_analytics(engine, date_start: dt.datetime, date_end: dt.datetime) -> AnalyticsReport:
+    marks = MarkColumns.load(engine, date_start, date_end)
+    users = UserColumns.load(engine)
+    return compute_analytics(marks, users, date_start, date_end)
+
+
+def format_analytics(report: AnalyticsReport) -> str:
+    # marks are stored from 0, users see them from 1
+    lines = [
+        f"📊 {report.date_start:%Y-%m-%d} - {report.date_end:%Y-%m-%d}",
+        f"users: {report.users}, active: {report.active_users}, with marks: {report.users_with_marks}",
+        f"marks: {report.marks}, response rate: {report.response_rate:.1%}",
+        "marks distribution: " + ", ".join(
+            f"{value + 1}: {count}" for value, count in enumerate(report.mark_distribution)),
+        "user mean mark p10/p50/p90: " + "/".join(f"{value + 1:.2f}" for value in report.user_mean_mark_quantiles),
+        "by weekday:",
+    ]
+    for weekday, count, mean in zip(WEEKDAYS, report.marks_by_weekday, report.mean_mark_by_weekday):
+        lines.append(f"    {weekday}: {count} marks, mean {mean + 1:.2f}")
+    lines.append("by hour:")
+    for hour, (count, mean) in enumerate(zip(report.marks_by_hour, report.mean_mark_by_hour)):
+        if count:
+            lines.append(f"    {hour:02d}: {count} marks, mean {mean + 1:.2f}")
+
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    from configs.definitions import ROOT_DIR
+    from db.engine import create_reader_engine
+    import lib.utils as ut
+
+    parser = argparse.ArgumentParser(description='aggregate statistics over all users')
+    parser.add_argument('--days', type=int, default=30, help='length of period which ends now')
+    parser.add_argument('--db', default=f"{ROOT_DIR}/{ut.config['bd_directory']}{ut.config['bd_name']}",
+                        help='path to sqlite database')
+    args = parser.parse_args()
+
+    date_end = dt.datetime.now()
+    date_start = date_end - dt.timedelta(days=args.days)
+    engine = create_reader_engine(args.db, ut.config['sqlite']['pragmas'])
+    print(format_analytics(build_analytics(engine, date_start, date_end)))
@@ -1,12 +1,25 @@
-from sqlalchemy import create_engine, select, distinct
+from sqlalchemy import select, distinct, insert
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any
-from datetime import datetime
+from functools import partial
+from typing import TYPE_CHECKING, Any, Iterator, AsyncIterator
+from datetime import date, datetime
+import asyncio
 import logging
 
-from db.tables import User, Mark
+from db.tables import User, Mark, MarkDailyRollup, MarkTrendStats
+from db.rollup import aggregate_marks, rollup_upsert, aggregate_trends, trend_upsert
 from configs.definitions import ROOT_DIR
+from db.engine import create_writer_engine, create_reader_engine
 from lib.table_processor import TableProcessor
+from lib.mark_queue import MarkWriteQueue
+from lib.settings_cache import SettingsCache, UserSettings
+from lib.trend import TrendStats
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy and lib.analytics are imported by the methods which use them, so the bot starts without them
 
 logger = logging.getLogger(__name__)
 
@@ -20,23 +33,53 @@ class Response:
 
 class MarkProcessor(TableProcessor):
 
-    def __init__(self, engine):
-        super().__init__(engine)
+    def __init__(self, engine, mark_queue: dict | None = None, read_engine=None):
+        super().__init__(engine, read_engine)
         self.table_model = Mark
 
-    def get_max_id(self):
-        return self._get_max_value_of_column(self.table_model, 'id')
+        # durability 'immediate' - every mark is committed before add_mark returns,
+        # 'batched' - marks are buffered and committed by the write-behind queue
+        mark_queue = mark_queue or {}
+        self.durability = mark_queue.get('durability', 'immediate')
+        self.write_queue = None
+        if self.durability == 'batched':
+            self.write_queue = MarkWriteQueue(
+                self.insert_marks,
+                batch_size=mark_queue.get('batch_size', 200),
+                flush_interval=mark_queue.get('flush_interval_ms', 50) / 1000,
+                max_retries=mark_queue.get('max_retries', 3),
+                backoff=mark_queue.get('retry_backoff_ms', 100) / 1000,
+            )
+
+    def insert_marks(self, rows: list[dict]) -> None:
+        """insert batch of marks with one executemany and one commit, ids are assigned by database,
+        daily rollups and trend statistics are updated in the same transaction"""
+        with self.sessionmaker() as session, session.begin():
+            session.execute(insert(Mark), rows)
+            session.execute(rollup_upsert(aggregate_marks(rows)))
+            session.execute(trend_upsert(aggregate_trends(rows)))
 
     def add_mark(self, telegram_id: int, mark: int) -> Response:
+        if self.write_queue is not None:
+            data = {
+                'telegram_id': telegram_id,
+                'mark': mark,
+                'mark_time': datetime.now(),
+            }
+            self.write_queue.put(data)
+            return Response(0, 'queued')
+
         try:
-            current_id = self.get_max_id() + 1
             data = {
-                'id': current_id,
                 'telegram_id': telegram_id,
                 'mark': mark,
                 'mark_time': datetime.now(),
             }
-            self._insert_values(self.table_model, data)
+            with self.sessionmaker() as session, session.begin():
+                # no RETURNING, it needs sqlite 3.35
+                current_id = session.execute(insert(Mark).values(**data)).inserted_primary_key[0]
+                session.execute(rollup_upsert(aggregate_marks([data])))
+                session.execute(trend_upsert(aggregate_trends([data])))
             logger.info(f"{mark=} from {telegram_id=} was inserted to DB")
             return Response(0, current_id)
         except Exception as e:
@@ -44,27 +87,37 @@ class MarkProcessor(TableProcessor):
             was not inserted to DB, exception - {e}")
             return Response(1, e)
 
+    @staticmethod
+    def users_with_activity_query(date_start: datetime, date_end: datetime):
+        stmt = select(distinct(Mark.telegram_id))\
+                .where(Mark.mark_time>=date_start)\
+                .where(Mark.mark_time<=date_end)
+        return stmt
+
+    @staticmethod
+    def marks_for_user_query(telegram_id: int, date_start: datetime, date_end: datetime):
+        stmt = select(Mark)\
+                .where(Mark.telegram_id==telegram_id)\
+                .where(Mark.mark_time>=date_start)\
+                .where(Mark.mark_time<=date_end)
+        return stmt
+
     def get_users_with_activity(self, date_start: datetime, date_end: datetime):
         try:
-            with self.sessionmaker() as session:
-                stmt = select(distinct(Mark.telegram_id))\
-                        .where(Mark.mark_time>=date_start)\
-                        .where(Mark.mark_time<=date_end)
+            with self.read_sessionmaker() as session:
+                stmt = self.users_with_activity_query(date_start, date_end)
 
                 data = session.scalars(stmt).all()
 
                 return Response(0, data)
         except Exception as e:
             return Response(1, str(e))
-                        
+
     def select_marks_for_user(self, telegram_id: str, date_start: datetime, date_end: datetime) -> Response:
 
         try:
-            with self.sessionmaker() as session:
-                stmt = select(Mark)\
-                        .where(Mark.telegram_id==telegram_id)\
-                        .where(Mark.mark_time>=date_start)\
-                        .where(Mark.mark_time<=date_end)
+            with self.read_sessionmaker() as session:
+                stmt = self.marks_for_user_query(telegram_id, date_start, date_end)
 
                 data = session.scalars(stmt).all()
 
@@ -76,12 +129,142 @@ class MarkProcessor(TableProcessor):
                 f"marks for {telegram_id=} were not executed")
             return Response(1, str(e))
 
+    def select_daily_rollups(self, telegram_id: int, date_start: date, date_end: date) -> Response:
+        """rollups of user for days in [date_start, date_end], days are server-local, not in user timezone"""
+        try:
+            with self.read_sessionmaker() as session:
+                stmt = select(MarkDailyRollup)\
+                        .where(MarkDailyRollup.telegram_id==telegram_id)\
+                        .where(MarkDailyRollup.day>=date_start)\
+                        .where(MarkDailyRollup.day<=date_end)\
+                        .order_by(MarkDailyRollup.day)
+
+                data = session.scalars(stmt).all()
+
+            return Response(0, data)
+        except Exception as e:
+            logger.error(f"daily rollups for {telegram_id=} were not executed")
+            return Response(1, str(e))
+
+    def select_trend_stats(self, telegram_id: int, window: str, window_starts: list[date]) -> Response:
+        """trend statistics of user for given windows, answer is dict window_start -> TrendStats"""
+        try:
+            with self.read_sessionmaker() as session:
+                stmt = select(MarkTrendStats)\
+                        .where(MarkTrendStats.telegram_id==telegram_id)\
+                        .where(MarkTrendStats.window==window)\
+                        .where(MarkTrendStats.window_start.in_(window_starts))
+
+                data = {row.window_start: TrendStats.from_row(row) for row in session.scalars(stmt)}
+
+            return Response(0, data)
+        except Exception as e:
+            logger.error(f"trend stats for {telegram_id=} were not executed")
+            return Response(1, str(e))
+
+    def select_window_trend_stats(self, window: str, window_start: date) -> Response:
+        """trend statistics of all users for one window, answer is dict telegram_id -> TrendStats"""
+        try:
+            with self.read_sessionmaker() as session:
+                stmt = select(MarkTrendStats)\
+                        .where(MarkTrendStats.window==window)\
+                        .where(MarkTrendStats.window_start==window_start)
+
+                data = {row.telegram_id: TrendStats.from_row(row) for row in session.scalars(stmt)}
+
+            return Response(0, data)
+        except Exception as e:
+            logger.error(f"trend stats for {window=} {window_start=} were not executed")
+            return Response(1, str(e))
+
+    @staticmethod
+    def _to_mark_arrays(data: "np.ndarray") -> tuple["np.ndarray", "np.ndarray"]:
+        """(epoch seconds, mark) matrix to datetime64 mark times and int8 marks"""
+        import numpy as np
+
+        return data[:, 0].astype('datetime64[s]'), data[:, 1].astype(np.int8)
+
+    def select_mark_arrays(self, telegram_id: int, date_start: datetime, date_end: datetime) -> Response:
+        """marks of user as (mark_times, marks) arrays, only needed columns are read without orm"""
+        from lib.analytics import epoch_seconds, fetch_columns
+
+        try:
+            stmt = select(epoch_seconds(Mark.mark_time), Mark.mark)\
+                    .where(Mark.telegram_id==telegram_id)\
+                    .where(Mark.mark_time>=date_start)\
+                    .where(Mark.mark_time<=date_end)\
+                    .order_by(Mark.mark_time)
+
+            with self.read_sessionmaker() as session:
+                data = fetch_columns(session.connection(), stmt, 2, chunk_size=10_000)
+
+            return Response(0, self._to_mark_arrays(data))
+        except Exception as e:
+            logger.error(
+                f"marks for {telegram_id=} were not executed")
+            return Response(1, str(e))
+
+    @staticmethod
+    def report_marks_query(date_start: datetime, date_end: datetime, telegram_ids: list[int] | None = None):
+        from lib.analytics import epoch_seconds
+
+        stmt = select(Mark.telegram_id, epoch_seconds(Mark.mark_time), Mark.mark)\
+                .where(Mark.mark_time>=date_start)\
+                .where(Mark.mark_time<=date_end)\
+                .order_by(Mark.telegram_id, Mark.mark_time)
+        if telegram_ids is not None:
+            stmt = stmt.where(Mark.telegram_id.in_(telegram_ids))
+        return stmt
+
+    def select_report_marks_after(self, telegram_id: int, date_start: datetime, date_end: datetime,
+                                  limit: int) -> tuple[int | None, "np.ndarray | None"]:
+        """marks of the next limit users after telegram_id as (telegram_id, epoch seconds, mark) matrix
+        and the last telegram_id of the page, (None, None) after the last page"""
+        from lib.analytics import fetch_columns
+
+        users = select(User.telegram_id).where(User.telegram_id > telegram_id).order_by(User.telegram_id).limit(limit)
+        # page is read fully and the session is closed before it is returned
+        with self.read_sessionmaker() as session:
+            telegram_ids = session.scalars(users).all()
+            if not telegram_ids:
+                return None, None
+            stmt = self.report_marks_query(date_start, date_end, telegram_ids)
+            data = fetch_columns(session.connection(), stmt, 3, chunk_size=10_000)
+        return telegram_ids[-1], data
+
+    def iter_report_marks(self, date_start: datetime, date_end: datetime,
+                          page_size: int = 500) -> Iterator[tuple[int, "np.ndarray", "np.ndarray"]]:
+        """marks of all users, yields (telegram_id, mark_times, marks) arrays per user
+
+        users are read in keyset pages of page_size like iter_active_users, so no cursor or read
+        transaction is kept open between yields while the report is sent, page_size stays under
+        999 bound parameters of sqlite before 3.32
+        """
+        import numpy as np
+
+        last_id = -1
+        while True:
+            last_id, data = self.select_report_marks_after(last_id, date_start, date_end, page_size)
+            if last_id is None:
+                return
+            if not len(data):
+                continue
+            telegram_ids = data[:, 0]
+            boundaries = np.flatnonzero(np.r_[True, telegram_ids[1:] != telegram_ids[:-1], True])
+            for start, end in zip(boundaries[:-1], boundaries[1:]):
+                yield int(telegram_ids[start]), *self._to_mark_arrays(data[start:end, 1:])
+
+    def close(self) -> None:
+        if self.write_queue is not None:
+            self.write_queue.close()
+
 
 class UserProcessor(TableProcessor):
 
-    def __init__(self, engine):
-        super().__init__(engine)
+    def __init__(self, engine, cache_size: int = 10000, read_engine=None):
+        super().__init__(engine, read_engine)
         self.table_model = User
+        self.cache = SettingsCache(cache_size)
 
     def add_user(self, telegram_id: int) -> Response:
         try:
@@ -94,19 +277,27 @@ class UserProcessor(TableProcessor):
                 'active_flag': False,
             }
             self._insert_values(self.table_model, data)
+            self.cache.invalidate(telegram_id)
             logger.info(f"{telegram_id=} was inserted to DB into user table")
             return Response(0, telegram_id)
         except Exception as e:
             logger.error(f"{telegram_id=} was not inserted to DB into user table")
             return Response(1, e)
 
-    def _get_user_info(self, telegram_id: int) -> Response:
+    def _get_user_info(self, telegram_id: int) -> list[UserSettings]:
+        settings, generation = self.cache.get(telegram_id)
+        if settings is not None:
+            return [settings]
+
         filter_values = {
             'telegram_id': telegram_id
         }
-        settings = self._get_filtered_data(self.table_model, filter_values)
+        rows = self._get_filtered_data(self.table_model, filter_values)
+        user_info = [UserSettings.from_row(row) for row in rows]
+        for settings in user_info:
+            self.cache.put(settings, generation)
 
-        return settings
+        return user_info
 
     def check_user_existence(self, telegram_id: int) -> Response:
         try:
@@ -126,11 +317,13 @@ class UserProcessor(TableProcessor):
             'frequency': frequency
         }
         try:
+            self.check_settings(change_values)
             self._change_column_value(self.table_model, filter_values, change_values)
+            self.cache.invalidate(telegram_id)
             logger.info(f"{telegram_id=} frequency was set to {frequency}")
             return Response(0, 'OK')
         except Exception as e:
-            logger.error(f"{telegram_id=} frequency was not set to {frequency}")
+            logger.error(f"{telegram_id=} frequency was not set to {frequency}, exception - {e}")
             return Response(1, e)
 
     def set_notifications_time(self, telegram_id: int, start_hour: int, end_hour: int, minute: int) -> Response:
@@ -144,6 +337,7 @@ class UserProcessor(TableProcessor):
         }
         try:
             self._change_column_value(self.table_model, filter_values, change_values)
+            self.cache.invalidate(telegram_id)
             logger.info(f"settings {telegram_id=} {start_hour=} {end_hour=} {minute=} was set")
             return Response(0, 'OK')
         except Exception as e:
@@ -159,12 +353,44 @@ class UserProcessor(TableProcessor):
         }
         try:
             self._change_column_value(self.table_model, filter_values, change_values)
+            self.cache.invalidate(telegram_id)
             logger.info(f"{telegram_id=} activity was set to {activity}")
             return Response(0, 'OK')
         except Exception as e:
             logger.error(f"{telegram_id=} activity was not set to {activity}")
             return Response(1, e)
 
+    @staticmethod
+    def check_settings(change_values: dict) -> None:
+        """settings which would break notification scheduling are not written"""
+        frequency = change_values.get('frequency')
+        if frequency is not None and frequency < 1:
+            raise ValueError(f"frequency should be at least 1, got {frequency}")
+
+    def update_user_settings(self, telegram_id: int, **change_values) -> Response:
+        """change several settings in one transaction, returns resulting UserSettings"""
+        filter_values = {
+            'telegram_id': telegram_id
+        }
+        try:
+            unknown_columns = set(change_values) - set(self.table_model.__table__.columns.keys())
+            if unknown_columns:
+                raise ValueError(f"unknown settings {unknown_columns}")
+            self.check_settings(change_values)
+            rows = self._change_column_value_and_select(self.table_model, filter_values, change_values)
+            self.cache.invalidate(telegram_id)
+            if len(rows) != 1:
+                logger.error(f"settings {telegram_id=} {change_values} was not set, user was not found")
+                return Response(1, 'user was not found')
+
+            settings = UserSettings.from_row(rows[0])
+            self.cache.put(settings)
+            logger.info(f"settings {telegram_id=} {change_values} was set")
+            return Response(0, settings)
+        except Exception as e:
+            logger.error(f"settings {telegram_id=} {change_values} was not set, exception - {e}")
+            return Response(1, e)
+
     def get_setups(self, telegram_id: int):
         try:
             user_info = self._get_user_info(telegram_id)
@@ -174,28 +400,60 @@ class UserProcessor(TableProcessor):
             logger.error(f"for {telegram_id=} settings was not returned")
             return Response(1, e)
 
+    @staticmethod
+    def active_users_query():
+        return select(User).where(User.active_flag == True)
+
     def get_all_active_users(self):
-        filter_values = {
-            'active_flag': True
-        }
         try:
-            active_users = self._get_filtered_data(self.table_model, filter_values)
+            rows = self.get_query_result(self.active_users_query())
+            active_users = [UserSettings.from_row(row) for row in rows]
             logger.info(f"active users was returned")
             return Response(0, active_users)
         except Exception as e:
             logger.error(f"active users was not returned")
             return Response(1, e)
 
+    def select_active_users_after(self, telegram_id: int, limit: int) -> list[UserSettings]:
+        # keyset page by primary key, so no cursor is kept open between pages,
+        # plain tuples in field order of UserSettings instead of ORM objects
+        stmt = (
+            select(
+                User.telegram_id, User.frequency, User.start_hour, User.end_hour, User.minute,
+                User.active_flag, User.timezone,
+            )
+            .where(User.active_flag == True, User.telegram_id > telegram_id)
+            .order_by(User.telegram_id)
+            .limit(limit)
+        )
+        with self.read_sessionmaker() as session:
+            return [UserSettings(*row) for row in session.execute(stmt).tuples()]
+
+    def iter_active_users(self, batch_size: int = 1000) -> Iterator[list[UserSettings]]:
+        """active users in pages of batch_size ordered by telegram_id"""
+        last_id = -1
+        while True:
+            users = self.select_active_users_after(last_id, batch_size)
+            if not users:
+                return
+            yield users
+            last_id = users[-1].telegram_id
+
+    def get_cache_info(self) -> dict:
+        return self.cache.info()
 
 
 
 class Backend:
 
-    def __init__(self, db_path: str):
-        data_base_uri = f"sqlite:///{ROOT_DIR}/{db_path}"
-        engine = create_engine(data_base_uri, echo=False, connect_args={"check_same_thread": False})
-        self.user_processor = UserProcessor(engine)
-        self.mark_processor = MarkProcessor(engine)
+    def __init__(self, db_path: str, mark_queue: dict | None = None, settings_cache_size: int = 10000,
+                 sqlite: dict | None = None):
+        sqlite = sqlite or {}
+        db_file = f"{ROOT_DIR}/{db_path}"
+        self.engine = create_writer_engine(db_file, sqlite.get('pragmas'))
+        self.read_engine = create_reader_engine(db_file, sqlite.get('pragmas'), sqlite.get('reader_pool_size', 4))
+        self.user_processor = UserProcessor(self.engine, settings_cache_size, self.read_engine)
+        self.mark_processor = MarkProcessor(self.engine, mark_queue, self.read_engine)
 
     def add_mark(self, telegram_id: int, mark: int) -> Response:
         return self.mark_processor.add_mark(telegram_id, mark)
@@ -215,14 +473,144 @@ class Backend:
     def set_activity(self, telegram_id: int, activity: bool) -> Response:
         return self.user_processor.set_activity(telegram_id, activity)
 
+    def update_user_settings(self, telegram_id: int, **change_values) -> Response:
+        return self.user_processor.update_user_settings(telegram_id, **change_values)
+
     def get_setups(self, telegram_id: int) -> Response:
         return self.user_processor.get_setups(telegram_id)
 
     def get_all_active_users(self):
         return self.user_processor.get_all_active_users()
 
+    def iter_active_users(self, batch_size: int = 1000) -> Iterator[list[UserSettings]]:
+        return self.user_processor.iter_active_users(batch_size)
+
+    def get_settings_cache_info(self) -> dict:
+        return self.user_processor.get_cache_info()
+
     def get_last_marks(self, telegram_id, date_start, date_end) -> Response:
         return self.mark_processor.select_marks_for_user(telegram_id, date_start, date_end)
 
     def get_users_with_activity(self, date_start: datetime, date_end: datetime) -> Response:
         return self.mark_processor.get_users_with_activity(date_start, date_end)
+
+    def get_daily_rollups(self, telegram_id: int, date_start: date, date_end: date) -> Response:
+        return self.mark_processor.select_daily_rollups(telegram_id, date_start, date_end)
+
+    def get_trend_stats(self, telegram_id: int, window: str, window_starts: list[date]) -> Response:
+        return self.mark_processor.select_trend_stats(telegram_id, window, window_starts)
+
+    def get_window_trend_stats(self, window: str, window_start: date) -> Response:
+        return self.mark_processor.select_window_trend_stats(window, window_start)
+
+    def get_mark_arrays(self, telegram_id: int, date_start: datetime, date_end: datetime) -> Response:
+        return self.mark_processor.select_mark_arrays(telegram_id, date_start, date_end)
+
+    def iter_report_marks(self, date_start: datetime, date_end: datetime) -> Iterator[tuple[int, "np.ndarray", "np.ndarray"]]:
+        return self.mark_processor.iter_report_marks(date_start, date_end)
+
+    def get_analytics(self, date_start: datetime, date_end: datetime) -> Response:
+        """aggregated statistics over all users, computed on the read engine"""
+        from lib.analytics import build_analytics
+
+        try:
+            report = build_analytics(self.read_engine, date_start, date_end)
+            logger.info(f"analytics for {date_start=} {date_end=} was built")
+            return Response(0, report)
+        except Exception as e:
+            logger.error(f"analytics for {date_start=} {date_end=} was not built, exception - {e}")
+            return Response(1, e)
+
+    def close(self) -> None:
+        self.mark_processor.close()
+        self.engine.dispose()
+        self.read_engine.dispose()
+
+
+class AsyncBackend:
+    """awaitable facade over Backend, every call is executed in a bounded db thread pool
+    so sqlite sessions and commits never run on the event loop"""
+
+    def __init__(self, db_path: str, max_workers: int = 4, mark_queue: dict | None = None,
+                 settings_cache_size: int = 10000, sqlite: dict | None = None):
+        self.sync = Backend(db_path, mark_queue, settings_cache_size, sqlite)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+
+    async def _run(self, method, *args, **kwargs) -> Response:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(method, *args, **kwargs))
+
+    async def add_mark(self, telegram_id: int, mark: int) -> Response:
+        return await self._run(self.sync.add_mark, telegram_id, mark)
+
+    async def add_user(self, telegram_id: int) -> Response:
+        return await self._run(self.sync.add_user, telegram_id)
+
+    async def check_user_existence(self, telegram_id: int) -> Response:
+        return await self._run(self.sync.check_user_existence, telegram_id)
+
+    async def set_frequency(self, telegram_id: int, frequency: int) -> Response:
+        return await self._run(self.sync.set_frequency, telegram_id, frequency)
+
+    async def set_notifications_time(self, telegram_id: int, start_hour: int, end_hour: int, minute: int) -> Response:
+        return await self._run(self.sync.set_notifications_time, telegram_id, start_hour, end_hour, minute)
+
+    async def set_activity(self, telegram_id: int, activity: bool) -> Response:
+        return await self._run(self.sync.set_activity, telegram_id, activity)
+
+    async def update_user_settings(self, telegram_id: int, **change_values) -> Response:
+        return await self._run(self.sync.update_user_settings, telegram_id, **change_values)
+
+    async def get_setups(self, telegram_id: int) -> Response:
+        return await self._run(self.sync.get_setups, telegram_id)
+
+    async def get_all_active_users(self) -> Response:
+        return await self._run(self.sync.get_all_active_users)
+
+    def get_settings_cache_info(self) -> dict:
+        return self.sync.get_settings_cache_info()
+
+    async def get_last_marks(self, telegram_id, date_start, date_end) -> Response:
+        return await self._run(self.sync.get_last_marks, telegram_id, date_start, date_end)
+
+    async def get_users_with_activity(self, date_start: datetime, date_end: datetime) -> Response:
+        return await self._run(self.sync.get_users_with_activity, date_start, date_end)
+
+    async def get_daily_rollups(self, telegram_id: int, date_start: date, date_end: date) -> Response:
+        return await self._run(self.sync.get_daily_rollups, telegram_id, date_start, date_end)
+
+    async def get_trend_stats(self, telegram_id: int, window: str, window_starts: list[date]) -> Response:
+        return await self._run(self.sync.get_trend_stats, telegram_id, window, window_starts)
+
+    async def get_window_trend_stats(self, window: str, window_start: date) -> Response:
+        return await self._run(self.sync.get_window_trend_stats, window, window_start)
+
+    async def get_mark_arrays(self, telegram_id: int, date_start: datetime, date_end: datetime) -> Response:
+        return await self._run(self.sync.get_mark_arrays, telegram_id, date_start, date_end)
+
+    async def iter_report_marks(self, date_start: datetime, date_end: datetime) -> AsyncIterator[tuple[int, "np.ndarray", "np.ndarray"]]:
+        # every page is fetched in the db pool, nothing stays open between groups
+        groups = self.sync.iter_report_marks(date_start, date_end)
+        try:
+            while True:
+                group = await self._run(next, groups, None)
+                if group is None:
+                    break
+                yield group
+        finally:
+            await self._run(groups.close)
+
+    async def iter_active_users(self, batch_size: int = 1000) -> AsyncIterator[list[UserSettings]]:
+        pages = self.sync.iter_active_users(batch_size)
+        while True:
+            users = await self._run(next, pages, None)
+            if users is None:
+                break
+            yield users
+
+    async def get_analytics(self, date_start: datetime, date_end: datetime) -> Response:
+        return await self._run(self.sync.get_analytics, date_start, date_end)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.sync.close()
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterable, Iterable
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+Send = Callable[[], Awaitable]
+
+
+class TokenBucket:
+    """global rate limiter, rate tokens per second with burst of capacity tokens"""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """stop giving tokens, used when telegram answers with RetryAfter"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class BroadcastSummary:
+    delivered: list[int] = field(default_factory=list)
+    failed: list[int] = field(default_factory=list)
+    blocked: list[int] = field(default_factory=list)
+    retries: int = 0
+
+    def __str__(self) -> str:
+        return (f"delivered={len(self.delivered)}, failed={len(self.failed)}, "
+                f"blocked={len(self.blocked)}, retries={self.retries}")
+
+
+class Broadcaster:
+    """sends messages with bounded concurrency, global and per chat rate limits and retries
+
+    every message is (chat_id, send) where send is coroutine function without arguments,
+    it can be called several times if message is retried
+    """
+
+    def __init__(self, concurrency: int = 20, rate: float = 30, per_chat_interval: float = 1.,
+                 max_retries: int = 3, backoff: float = 1.):
+        self.concurrency = concurrency
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.bucket = TokenBucket(rate)
+        self.last_sent: dict[int, float] = {}
+
+    async def _wait_chat(self, chat_id: int) -> None:
+        # slot is reserved before sleeping, so concurrent messages to one chat are spread too
+        now = time.monotonic()
+        last_sent = self.last_sent.get(chat_id)
+        scheduled = now if last_sent is None else max(now, last_sent + self.per_chat_interval)
+        self.last_sent[chat_id] = scheduled
+        if scheduled > now:
+            await asyncio.sleep(scheduled - now)
+
+    def _retry(self, queue: asyncio.Queue, item: tuple, delay: float, summary: BroadcastSummary) -> None:
+        """put message back to queue after delay, original item is done only after it is requeued"""
+        chat_id, send, attempt = item
+        summary.retries += 1
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            await queue.put((chat_id, send, attempt + 1))
+            queue.task_done()
+
+        asyncio.create_task(requeue())
+
+    async def _worker(self, queue: asyncio.Queue, summary: BroadcastSummary) -> None:
+        while True:
+            item = await queue.get()
+            chat_id, send, attempt = item
+            await self._wait_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                await send()
+                summary.delivered.append(chat_id)
+            except RetryAfter as e:
+                logger.error(f"flood control for chat_id = {chat_id}, retry after {e.retry_after}")
+                self.bucket.pause(e.retry_after)
+                self._retry(queue, item, e.retry_after, summary)
+                continue
+            except Forbidden as e:
+                logger.info(f"bot was blocked by chat_id = {chat_id}, Exception: {e}")
+                summary.blocked.append(chat_id)
+            except BadRequest as e:
+                logger.error(f"bad request for chat_id = {chat_id}, Exception: {e}")
+                summary.failed.append(chat_id)
+            except NetworkError as e:
+                if attempt < self.max_retries:
+                    logger.error(f"network error for chat_id = {chat_id}, {attempt=}, Exception: {e}")
+                    self._retry(queue, item, self.backoff * 2 ** attempt, summary)
+                    continue
+                logger.error(f"message for chat_id = {chat_id} was not sent, Exception: {e}")
+                summary.failed.append(chat_id)
+            except Exception as e:
+                logger.error(f"message for chat_id = {chat_id} was not sent, Exception: {e}")
+                summary.failed.append(chat_id)
+            queue.task_done()
+
+    def _forget_chats(self) -> None:
+        threshold = time.monotonic() - self.per_chat_interval
+        self.last_sent = {chat_id: sent for chat_id, sent in self.last_sent.items() if sent > threshold}
+
+    async def broadcast(self, messages: Iterable[tuple[int, Send]] | AsyncIterable[tuple[int, Send]]) -> BroadcastSummary:
+        summary = BroadcastSummary()
+        queue = asyncio.Queue(maxsize=2 * self.concurrency)
+        workers = [asyncio.create_task(self._worker(queue, summary)) for _ in range(self.concurrency)]
+
+        try:
+            if isinstance(messages, AsyncIterable):
+                async for chat_id, send in messages:
+                    await queue.put((chat_id, send, 0))
+            else:
+                for chat_id, send in messages:
+                    await queue.put((chat_id, send, 0))
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._forget_chats()
+
+        return summary
@@ -0,0 +1,75 @@
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# callback data is '<version><kind><value>', for example '1m3' is mark 3,
+# telegram limits it with 64 bytes so it is kept as short as possible
+CALLBACK_VERSION = '1'
+
+MARK = 'm'
+START_HOUR = 's'
+END_HOUR = 'e'
+FREQUENCY = 'f'
+MINUTE = 'n'
+DZYN = 'd'
+
+# callback data of keyboards which were sent before versioned encoding
+LEGACY_KINDS = {
+    'mark': MARK,
+    'start_hour': START_HOUR,
+    'end_hour': END_HOUR,
+    'freq': FREQUENCY,
+    'minute': MINUTE,
+    'dzyn': DZYN,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class CallbackPayload:
+    kind: str
+    value: int | None = None
+
+
+def encode_callback(kind: str, value: int | None = None) -> str:
+    return f"{CALLBACK_VERSION}{kind}{'' if value is None else value}"
+
+
+def decode_callback(data: str) -> CallbackPayload | None:
+    try:
+        if data[:1] == CALLBACK_VERSION:
+            kind, value = data[1:2], data[2:]
+        else:
+            name, _, value = data.partition('=')
+            kind = LEGACY_KINDS[name]
+        return CallbackPayload(kind, int(value) if value else None)
+    except (KeyError, ValueError):
+        return None
+
+
+Handler = Callable[[Update, ContextTypes.DEFAULT_TYPE, CallbackPayload], Awaitable]
+
+
+class CallbackRouter:
+    """single entry point for all callback queries, handler is found by kind of payload in one dict lookup"""
+
+    def __init__(self):
+        self.handlers: dict[str, Handler] = {}
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self.handlers[kind] = handler
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        payload = decode_callback(query.data or '')
+        handler = self.handlers.get(payload.kind) if payload is not None else None
+        if handler is None:
+            logger.error(f"unknown callback {query.data=} from {query.from_user.id=}")
+            await query.answer()
+            return None
+
+        return await handler(update, context, payload)
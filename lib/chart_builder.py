@@ -1,26 +1,75 @@
-import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.dates as dates
+import hashlib
 import io
-from abc import abstractmethod, ABC
+import threading
+from abc import ABC
+from collections import OrderedDict
+
+from dateutil import rrule
+
+from lib.trend import TrendStats
 
 
 class ChartBuilder(ABC):
+    """drawers are described by class attributes only, so instances are cheap to pickle
+    and can be sent to render worker processes
+
+    pyplot is not used, every thread keeps its own figure template per drawer type,
+    so rendering is safe to run in threads
+
+    numpy, matplotlib and Pillow are imported by the methods which use them,
+    so they are loaded with the first chart and not with the bot
+    """
+
+    # (rrule frequency, interval) for major and minor ticks
+    major_rule: tuple[int, int]
+    minor_rule: tuple[int, int]
+    title: str
+    # trend statistics window, see lib.trend
+    window: str
+
+    # output encoding: png - matplotlib png, png8 - palette png with `colors` colors,
+    # webp and jpeg - lossy with `quality`
+    output_format = 'png8'
+    dpi = 80
+    colors = 16
+    quality = 80
+
+    _templates = threading.local()
+
+    def __init__(self, output_format: str | None = None, dpi: int | None = None,
+                 colors: int | None = None, quality: int | None = None) -> None:
+        if output_format is not None:
+            self.output_format = output_format
+        if dpi is not None:
+            self.dpi = dpi
+        if colors is not None:
+            self.colors = colors
+        if quality is not None:
+            self.quality = quality
 
-    def __init__(self) -> None:
-        pass
+    def encoding_key(self) -> str:
+        return f"{self.output_format}:{self.dpi}:{self.colors}:{self.quality}"
 
-    @abstractmethod
     def setup_plot(self):
-        raise NotImplemented
+        import matplotlib.dates as dates
+
+        rule_major = dates.rrulewrapper(self.major_rule[0], interval=self.major_rule[1])
+        rule_minor = dates.rrulewrapper(self.minor_rule[0], interval=self.minor_rule[1])
+        return rule_major, rule_minor, self.title
 
     def plot(self):
+        import matplotlib.dates as dates
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
         rule_major, rule_minor, title = self.setup_plot()
         loc_major = dates.RRuleLocator(rule_major)
         loc_minor = dates.RRuleLocator(rule_minor)
         formatter = dates.DateFormatter('%m/%d')
 
-        fig, ax = plt.subplots()
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
         ax.xaxis.set_major_locator(loc_major)
         ax.xaxis.set_minor_locator(loc_minor)
         ax.xaxis.set_major_formatter(formatter)
@@ -30,45 +79,132 @@ class ChartBuilder(ABC):
 
         return fig, ax
 
+    def get_template(self):
+        """figure and axes of this drawer type for current thread, created once"""
+        templates = self._templates.__dict__
+        key = type(self).__name__
+        if key not in templates:
+            templates[key] = self.plot()
+        return templates[key]
+
     def get_x_nums(self, x_dates):
+        import matplotlib.dates as dates
+
         x_nums = dates.date2num(x_dates)
         return x_nums
 
-    def get_trend(self, x_nums, y):
-        trend = np.polyfit(x_nums, y, 1)
-        fit = np.poly1d(trend)
+    def get_trend(self, x_nums, y, trend: "TrendStats | None" = None):
+        """trend line from precomputed statistics, polyfit is used only if they are not passed"""
+        import numpy as np
+        import matplotlib.dates as dates
+
         x_fit = np.linspace(x_nums.min(), x_nums.max())
+        if trend is None:
+            fit = np.poly1d(np.polyfit(x_nums, y, 1))
+            trend_y = fit(x_fit)
+        else:
+            trend_y = trend.predict(x_fit - dates.date2num(trend.window_start))
         trend_x = dates.num2date(x_fit)
-        trend_y = fit(x_fit)
         return trend_x, trend_y
 
-    def draw(self, x_dates, y):
-        x_nums = self.get_x_nums(x_dates)
-        trend_x, trend_y = self.get_trend(x_nums, y)
-        fig, ax = self.plot()
-        ax.plot(x_dates, y, 'r*', markersize=12)
-        ax.plot(trend_x, trend_y, "r--")
+    def encode(self, fig) -> bytes:
+        from PIL import Image
+
         buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close(fig)
+        if self.output_format == 'png':
+            fig.savefig(buf, format='png', dpi=self.dpi)
+            return buf.getvalue()
+
+        fig.set_dpi(self.dpi)
+        fig.canvas.draw()
+        image = Image.frombuffer('RGBA', fig.canvas.get_width_height(), fig.canvas.buffer_rgba()).convert('RGB')
+        if self.output_format == 'png8':
+            # charts use only a few colors, palette png is several times smaller than rgba one
+            image = image.quantize(colors=self.colors, method=Image.Quantize.FASTOCTREE)
+            image.save(buf, format='PNG', optimize=True)
+        elif self.output_format == 'webp':
+            image.save(buf, format='WEBP', quality=self.quality)
+        elif self.output_format == 'jpeg':
+            image.save(buf, format='JPEG', quality=self.quality, optimize=True)
+        else:
+            raise ValueError(f"unknown chart format {self.output_format}")
 
+        return buf.getvalue()
+
+    def render(self, x_dates, y, trend: "TrendStats | None" = None) -> bytes:
+        """draw chart and return image bytes in output_format"""
+        x_nums = self.get_x_nums(x_dates)
+        trend_x, trend_y = self.get_trend(x_nums, y, trend)
+        fig, ax = self.get_template()
+        lines = ax.plot(x_dates, y, 'r*', markersize=12)
+        lines += ax.plot(trend_x, trend_y, "r--")
+        try:
+            return self.encode(fig)
+        finally:
+            # template is cleaned for the next chart
+            for line in lines:
+                line.remove()
+            ax.relim()
+
+    def draw(self, x_dates, y, trend: "TrendStats | None" = None):
+        buf = io.BytesIO(self.render(x_dates, y, trend))
         return buf
-        
+
 
 class WeekDrawer(ChartBuilder):
 
-    def setup_plot(self):
-        rule_major = dates.rrulewrapper(dates.DAILY, interval=1)
-        rule_minor = dates.rrulewrapper(dates.HOURLY, interval=4)
-        title = 'History of your marks for last week'
-        return rule_major, rule_minor, title
-        
+    major_rule = (rrule.DAILY, 1)
+    minor_rule = (rrule.HOURLY, 4)
+    title = 'History of your marks for last week'
+    window = 'week'
+
 
 class MonthDrawer(ChartBuilder):
 
-    def setup_plot(self):
-        rule_major = dates.rrulewrapper(dates.DAILY, interval=3)
-        rule_minor = dates.rrulewrapper(dates.DAILY, interval=1)
-        title = 'History of your marks for last month'
-        return rule_major, rule_minor, title
+    major_rule = (rrule.DAILY, 3)
+    minor_rule = (rrule.DAILY, 1)
+    title = 'History of your marks for last month'
+    window = 'month'
+
+
+def chart_key(drawer: ChartBuilder, x_dates, y, trend=None) -> bytes:
+    """hash of everything which changes the chart"""
+    import numpy as np
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(type(drawer).__name__.encode())
+    digest.update(drawer.encoding_key().encode())
+    digest.update(np.asarray(x_dates, dtype='datetime64[s]').tobytes())
+    digest.update(np.asarray(y, dtype=np.int64).tobytes())
+    digest.update(repr(trend).encode())
+    return digest.digest()
+
+
+class ChartCache:
+    """thread safe lru cache of rendered charts bounded by total size in bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.data: OrderedDict[bytes, bytes] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: bytes) -> bytes | None:
+        with self.lock:
+            chart = self.data.get(key)
+            if chart is not None:
+                self.data.move_to_end(key)
+            return chart
+
+    def put(self, key: bytes, chart: bytes) -> None:
+        if len(chart) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.data.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.data[key] = chart
+            self.size += len(chart)
+            while self.size > self.max_bytes:
+                _, evicted = self.data.popitem(last=False)
+                self.size -= len(evicted)
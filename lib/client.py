@@ -1,5 +1,9 @@
-from datetime import datetime, time
+import asyncio
+from functools import partial
+from datetime import date, datetime, time, timedelta, timezone
 import logging
+import secrets
+import pytz
 from telegram import ReplyKeyboardRemove, Update
 from telegram.ext import (
     Application,
@@ -10,14 +14,21 @@ from telegram.ext import (
     MessageHandler,
     filters
 )
-from telegram.error import BadRequest
 from dataclasses import dataclass
 
 import lib.keyboards as kb
 import lib.utils as ut
-from configs.constants import week_repeat_time, month_repeat_time
-from lib.backend import Backend
+import lib.callback_router as cr
+from lib.callback_router import CallbackPayload, CallbackRouter
+from configs.constants import TZ, week_repeat_time, month_repeat_time, ADMIN_IDS, WEBHOOK_SECRET
+from lib.backend import AsyncBackend
 from lib.chart_builder import WeekDrawer, MonthDrawer, ChartBuilder
+from lib.render_pool import ChartRenderPool
+from lib.broadcaster import Broadcaster
+from lib.persistence import SQLitePersistence
+from lib.update_processor import PerUserUpdateProcessor
+from lib.trend import get_window_start, trend_summary_text
+from lib.scheduler import NotificationIndex, seconds_to_next_minute
 
 menu_names = ut.get_menu_names()
 texts = ut.get_texts()
@@ -48,18 +59,44 @@ class Client:
         DEACTIVATE: int
 
     def __init__(self, token: str, bd_path: str):
-        self.backend = Backend(bd_path)
-        self.application = Application.builder().token(token).build()
+        self.backend = AsyncBackend(
+            bd_path,
+            max_workers=ut.config['db_executor_workers'],
+            mark_queue=ut.config['mark_queue'],
+            settings_cache_size=ut.config['settings_cache_size'],
+            sqlite=ut.config['sqlite'],
+        )
+        self.render_pool = ChartRenderPool(ut.config['chart_render_workers'], ut.config['chart_cache_bytes'])
+        self.broadcaster = Broadcaster(**ut.config['broadcast'])
+        self.notification_index = NotificationIndex()
+        self.ingestion = ut.config['ingestion']
+        self.persistence = SQLitePersistence(self.backend.sync.engine, **ut.config['persistence'])
+        self.application = self.build_telegram_application(token, self.ingestion, self.persistence)
         self.job_queue = self.application.job_queue
         self.states = self.get_states()
 
+    @staticmethod
+    def build_telegram_application(token: str, ingestion: dict, persistence: SQLitePersistence = None) -> Application:
+        builder = Application.builder().token(token)
+        # conversation state needs updates of one user one by one, so only updates of different users
+        # are processed concurrently, without the setting everything is processed one by one
+        concurrent_updates = int(ingestion.get('concurrent_updates') or 1)
+        if concurrent_updates > 1:
+            builder = builder.concurrent_updates(PerUserUpdateProcessor(concurrent_updates))
+        if persistence is not None:
+            builder = builder.persistence(persistence)
+        if ingestion.get('base_url'):
+            # bot api server other than api.telegram.org, e.g. a local fake one
+            builder = builder.base_url(ingestion['base_url'])
+        return builder.build()
+
     def get_states(self):
         states = self.States(*range(10))
         return states
 
-    def get_user_schedule(self, user_id) -> str|bool:
+    async def get_user_schedule(self, user_id) -> str|bool:
 
-        response = self.backend.get_setups(user_id)
+        response = await self.backend.get_setups(user_id)
         if response.status or len(response.answer) != 1:
             return False
         user_info = response.answer[0]
@@ -80,79 +117,68 @@ class Client:
         else:
             return "🔕 notifications is off"
 
-    @staticmethod
-    def reset_all_user_jobs(user_id, context: ContextTypes.DEFAULT_TYPE) -> bool:
-        for hour in range(24):
-            job_name = f"{user_id}_{hour}"
-            current_jobs = context.job_queue.get_jobs_by_name(job_name)
-
-            for job in current_jobs:
-                job.schedule_removal()
-                logger.info(f"Job {job_name=} removed")
+    def reset_all_user_jobs(self, user_id) -> bool:
+        slots = self.notification_index.get_slots(user_id)
+        self.notification_index.remove_user(user_id)
+        logger.info(f"{len(slots)} notifications for {user_id=} removed")
         return True
 
-    @staticmethod
-    async def notification(context: ContextTypes.DEFAULT_TYPE) -> None:
+    async def notification_tick(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """runs every minute and notifies all users due since the previous tick"""
+        due = self.notification_index.take_due(datetime.now(timezone.utc))
+        users = set().union(*due.values())
+        if not users:
+            return
 
-        job = context.job
-        user_id, hour = map(int, job.data.split('_'))
         markup = kb.get_inline_mark()
-        await context.bot.send_message(job.user_id, text=f"evaluate your condition", reply_markup=markup)
-        logger.info(f"notification sent {job.user_id=}, {hour=}")
-
-    def make_jobs(self, user_id: int, context: ContextTypes.DEFAULT_TYPE):
-        response = self.backend.get_setups(user_id)
-        if response.status or len(response.answer) != 1:
-            logger.error(f"Due job create {response.status=}, {response.answer=}")
-            return False
-        settings = response.answer[0]
+        messages = [
+            (user_id, partial(context.bot.send_message, user_id, text=f"evaluate your condition", reply_markup=markup))
+            for user_id in users
+        ]
+        # broadcast can outlast the interval, a still running tick would make the job queue skip the next minutes
+        context.application.create_task(self.send_notifications(messages, list(due)), update=None)
+
+    async def send_notifications(self, messages: list, minutes: list[int]) -> None:
+        summary = await self.broadcaster.broadcast(messages)
+        logger.info(f"notifications sent for {minutes=}: {summary}")
+
+    async def make_jobs(self, user_id: int, context: ContextTypes.DEFAULT_TYPE, settings=None):
+        # settings could be passed right after they were written to skip one more read
+        if settings is None:
+            response = await self.backend.get_setups(user_id)
+            if response.status or len(response.answer) != 1:
+                logger.error(f"Due job create {response.status=}, {response.answer=}")
+                return False
+            settings = response.answer[0]
         if not settings.active_flag:
             logger.error(f"Due job create {settings.active_flag=}")
             return True
-        self.reset_all_user_jobs(user_id, context)
-        start_hour = settings.start_hour
-        end_hour = settings.end_hour
-        minute = settings.minute
-        frequency = settings.frequency
 
-        notification_times = []
-
-        for hour in range(start_hour, end_hour+1, frequency):
-
-            mark_time = ut.time_to_utc(hour, minute)
-            name = f"{user_id}_{hour}"
-            days = (0, 1, 2, 3, 4, 5, 6)
-            context.job_queue.run_daily(self.notification, mark_time, user_id=user_id, days=days, name=name, data=name)
-            logger.info(f"create job for {user_id=} {hour=}, utc:{mark_time=}")
-            notification_times.append(mark_time)
+        slots = self.notification_index.update_user(settings)
+        notification_times = [time(slot // 60, slot % 60) for slot in slots]
+        logger.info(f"notifications for {user_id=} were scheduled, utc:{notification_times}")
 
         return notification_times
 
     def initialize_jobs(self) -> None:
-        response = self.backend.get_all_active_users()
-        if response.status:
-            logger.error("can not get_all_active_users ")
-            return
-        users = response.answer
-
-        for settings in users:
-            user_id = settings.telegram_id
-            start_hour = settings.start_hour
-            end_hour = settings.end_hour
-            minute = settings.minute
-            frequency = settings.frequency
-
-            for hour in range(start_hour, end_hour, frequency):
-                mark_time = ut.time_to_utc(hour, minute)
-                name = f"{user_id}_{hour}"
-                days = (0, 1, 2, 3, 4, 5, 6)
-                self.application.job_queue.run_daily(self.notification, mark_time, user_id=user_id,
-                                                     days=days, name=name, data=name)
-                logger.info(f"create job for {user_id=} {hour=}, utc:{mark_time=}")
+        # index is loaded by a background job, so updates are served right after start
+        first = seconds_to_next_minute(datetime.now(timezone.utc))
+        self.job_queue.run_repeating(self.notification_tick, interval=60, first=first, name='notification_tick')
+        self.job_queue.run_once(self.load_notification_index, when=0, name='load_notification_index')
+
+    async def load_notification_index(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self.notification_index.begin_load()
+        try:
+            async for users in self.backend.iter_active_users(ut.config['startup']['user_batch_size']):
+                self.notification_index.load_users(users)
+        except Exception as e:
+            logger.error(f"notification index was not loaded, exception - {e}")
+        finally:
+            self.notification_index.finish_load()
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user_id = update.message.from_user.id
-        response = self.backend.check_user_existence(user_id)
+        response = await self.backend.check_user_existence(user_id)
         if response.status:
             text = "Something crashed, reply bot admin"
             await update.message.reply_text(
@@ -191,11 +217,13 @@ class Client:
 
         return self.states.SETTINGS
 
-    async def proceed_start_hour_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    async def proceed_start_hour_callback(
+            self, update: Update, context: ContextTypes.DEFAULT_TYPE, payload: CallbackPayload
+    ) -> int:
         query = update.callback_query
         await query.answer()
 
-        hour = int(query.data.split('=')[1])
+        hour = payload.value
         # user_id = query.from_user.id
 
         context.user_data['start_hour'] = hour
@@ -206,11 +234,13 @@ class Client:
 
         return self.states.SETTINGS
 
-    async def proceed_end_hour_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    async def proceed_end_hour_callback(
+            self, update: Update, context: ContextTypes.DEFAULT_TYPE, payload: CallbackPayload
+    ) -> int:
         query = update.callback_query
         await query.answer()
 
-        hour = int(query.data.split('=')[1])
+        hour = payload.value
         # user_id = query.from_user.id
 
         if hour < context.user_data['start_hour']:
@@ -227,14 +257,21 @@ class Client:
 
         return self.states.SETTINGS
 
-    async def proceed_frequencies_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    async def proceed_frequencies_callback(
+            self, update: Update, context: ContextTypes.DEFAULT_TYPE, payload: CallbackPayload
+    ) -> int:
         query = update.callback_query
         await query.answer()
 
-        frequency = int(query.data.split('=')[1])
+        frequency = payload.value
         user_id = query.from_user.id
 
-        self.backend.set_frequency(user_id, frequency)
+        # keyboards sent before frequency 0 was removed could still be pressed
+        if frequency < 1:
+            await query.edit_message_text(text=texts.set_frequency, reply_markup=kb.get_frequencies())
+            return self.states.SETTINGS
+
+        await self.backend.set_frequency(user_id, frequency)
         context.user_data['frequency'] = frequency
 
         text = texts.set_minute
@@ -253,34 +290,35 @@ class Client:
 
         return notification_times
 
-    async def proceed_minute_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    async def proceed_minute_callback(
+            self, update: Update, context: ContextTypes.DEFAULT_TYPE, payload: CallbackPayload
+    ) -> int:
         query = update.callback_query
         await query.answer()
 
-        minute = int(query.data.split('=')[1])
+        minute = payload.value
         user_id = query.from_user.id
         start_hour=context.user_data['start_hour']
         end_hour=context.user_data['end_hour']
         frequency=context.user_data['frequency']
 
-        response_1 = self.backend.set_notifications_time(
-                telegram_id=user_id, 
+        response = await self.backend.update_user_settings(
+                telegram_id=user_id,
                 start_hour=start_hour,
                 end_hour=end_hour,
                 minute=minute,
+                frequency=frequency,
+                active_flag=True,
         )
 
-        response_2 = self.backend.set_frequency(user_id, frequency)
-        response_3 = self.backend.set_activity(user_id, activity=True)
-
-        if response_1.status or response_2.status or response_3.status:
+        if response.status:
             text = "Something crashed, reply bot admin"
             await update.message.reply_text(
                 text,
             )
             return self.states.MAIN_MENU
 
-        notifications = self.make_jobs(user_id, context)
+        notifications = await self.make_jobs(user_id, context, response.answer)
         if notifications == False:
 
             text = " crashed, reply bot admin"
@@ -313,7 +351,7 @@ class Client:
 
     async def proceed_register_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user_id = update.message.from_user.id
-        response = self.backend.add_user(user_id)
+        response = await self.backend.add_user(user_id)
         if response.status:
             text = "Something crashed, reply bot admin"
             await update.message.reply_text(
@@ -349,17 +387,22 @@ class Client:
 
         user_id = update.message.from_user.id
 
-        response_1 = self.backend.set_notifications_time(user_id, start_hour, end_hour, minute)
-        response_2 = self.backend.set_frequency(user_id, frequency)
-        response_3 = self.backend.set_activity(user_id, activity=True)
-        if response_1.status or response_2.status or response_3.status:
+        response = await self.backend.update_user_settings(
+                user_id,
+                start_hour=start_hour,
+                end_hour=end_hour,
+                minute=minute,
+                frequency=frequency,
+                active_flag=True,
+        )
+        if response.status:
             text = "Something crashed, reply bot admin"
             await update.message.reply_text(
                 text,
             )
             return self.states.MAIN_MENU
 
-        notification_times = self.make_jobs(user_id, context)
+        notification_times = await self.make_jobs(user_id, context, response.answer)
         if notification_times == False:
 
             text = " crashed, reply bot admin"
@@ -381,7 +424,7 @@ class Client:
     async def push_to_settings(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
         user_id = update.message.from_user.id
-        response = self.backend.get_setups(user_id)
+        response = await self.backend.get_setups(user_id)
         if response.status or len(response.answer) != 1:
             text = "Something crashed, reply bot admin"
             await update.message.reply_text(
@@ -389,7 +432,7 @@ class Client:
             )
             return self.states.MAIN_MENU
 
-        text = self.get_user_schedule(user_id)
+        text = await self.get_user_schedule(user_id)
         text += "\n" + chose_move_text
         active_flag = response.answer[0].active_flag
 
@@ -411,16 +454,16 @@ class Client:
 
     async def proceed_activate(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user_id = update.message.from_user.id
-        response = self.backend.set_activity(user_id, activity=True)
+        response = await self.backend.update_user_settings(user_id, active_flag=True)
 
-        if not self.make_jobs(user_id, context):
+        if response.status or not await self.make_jobs(user_id, context, response.answer):
             text = "Something crashed, reply bot admin"
             await update.message.reply_text(
                 text,
             )
             return self.states.MAIN_MENU
 
-        text = self.get_user_schedule(user_id)
+        text = await self.get_user_schedule(user_id)
 
         markup = kb.main_menu()
         await update.message.reply_text(
@@ -432,8 +475,8 @@ class Client:
 
     async def proceed_deactivate(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user_id = update.message.from_user.id
-        response = self.backend.set_activity(user_id, activity=False)
-        self.reset_all_user_jobs(user_id, context)
+        response = await self.backend.set_activity(user_id, activity=False)
+        self.reset_all_user_jobs(user_id)
         text = "Notifications deactivated!"
         markup = kb.main_menu()
         await update.message.reply_text(
@@ -442,21 +485,100 @@ class Client:
         )
         return self.states.MAIN_MENU
 
-    async def proceed_mark_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    async def proceed_mark_callback(
+            self, update: Update, context: ContextTypes.DEFAULT_TYPE, payload: CallbackPayload
+    ) -> int:
         query = update.callback_query
         await query.answer()
 
-        mark = int(query.data.split('=')[1])
+        mark = payload.value
         user_id = query.from_user.id
 
-        response = self.backend.add_mark(user_id, mark)
+        response = await self.backend.add_mark(user_id, mark)
         text = "Mark was set"
         markup = kb.dzyn_keyboard()
         await query.edit_message_text(text=text, reply_markup=markup)
 
         return self.states.MAIN_MENU
 
-    async def process_dzyn_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def send_trend_summary(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user_id = update.message.from_user.id
+        current_week = get_window_start('week', date.today())
+        previous_week = current_week - timedelta(days=7)
+
+        response = await self.backend.get_trend_stats(user_id, 'week', [current_week, previous_week])
+        if response.status:
+            text = "Something crashed, reply bot admin"
+        else:
+            text = trend_summary_text(response.answer.get(current_week), response.answer.get(previous_week))
+
+        await update.message.reply_text(
+            text,
+        )
+
+    async def set_timezone(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user_id = update.message.from_user.id
+        if not context.args:
+            response = await self.backend.get_setups(user_id)
+            if response.status or len(response.answer) != 1:
+                text = "Please push /start first"
+            else:
+                text = (f"Your timezone is {response.answer[0].timezone or TZ}. "
+                        f"To change it send /timezone with its name, for example /timezone Europe/Berlin")
+            await update.message.reply_text(
+                text,
+            )
+            return
+
+        tz_name = context.args[0]
+        if tz_name not in pytz.all_timezones_set:
+            await update.message.reply_text(
+                f"Unknown timezone {tz_name}, please use a name like Europe/Berlin or America/New_York",
+            )
+            return
+
+        response = await self.backend.update_user_settings(user_id, timezone=tz_name)
+        if response.status:
+            text = "Something crashed, reply bot admin"
+        else:
+            await self.make_jobs(user_id, context, response.answer)
+            local_time = datetime.now(pytz.timezone(tz_name)).strftime("%H:%M")
+            text = f"Timezone {tz_name} was set, your local time is {local_time}"
+
+        await update.message.reply_text(
+            text,
+        )
+
+    async def send_admin_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user_id = update.message.from_user.id
+        if user_id not in ADMIN_IDS:
+            logger.error(f"{user_id=} requested admin stats")
+            return
+
+        try:
+            days = int(context.args[0]) if context.args else 30
+        except ValueError:
+            await update.message.reply_text(
+                "Invalid format, use /stats <days>",
+            )
+            return
+
+        end_time = datetime.now()
+        response = await self.backend.get_analytics(end_time - timedelta(days=days), end_time)
+        if response.status:
+            text = "Something crashed, check logs"
+        else:
+            # analytics pulls numpy, it is imported on first use
+            from lib.analytics import format_analytics
+            text = format_analytics(response.answer)
+
+        await update.message.reply_text(
+            text,
+        )
+
+    async def process_dzyn_callback(
+            self, update: Update, context: ContextTypes.DEFAULT_TYPE, payload: CallbackPayload
+    ):
         query = update.callback_query
         await query.answer()
 
@@ -470,28 +592,32 @@ class Client:
         return ConversationHandler.END
 
     async def build_report(self, context, drawer: ChartBuilder, start_time: datetime, end_time: datetime) -> None:
-        resp = self.backend.get_users_with_activity(start_time, end_time)
-        users = resp.answer
-        for user in users:
-            resp = self.backend.get_last_marks(user, start_time, end_time)
-            last_marks = resp.answer
-            mark_times = [mark.mark_time for mark in last_marks]
-            marks = [mark.mark for mark in last_marks]
-            chart = drawer.draw(mark_times, marks)
-
-            try:
-                await context.bot.send_photo(chat_id=user, photo=chart)
-            except BadRequest as e:
-                logger.error("bad request for chat_id = {user}, Exception: {e}")
+        resp = await self.backend.get_window_trend_stats(drawer.window, start_time.date())
+        trends = {} if resp.status else resp.answer
+
+        async def messages():
+            # charts are rendered in the pool while broadcaster sends the previous ones,
+            # broadcaster queue bounds the number of charts in flight
+            user_marks = self.backend.iter_report_marks(start_time, end_time)
+            async for user, mark_times, marks in user_marks:
+                chart = self.render_pool.submit(drawer, mark_times, marks, trends.get(user))
+                yield user, partial(self.send_chart, context.bot, user, chart)
+
+        summary = await self.broadcaster.broadcast(messages())
+        logger.info(f"report {drawer.title!r} was sent: {summary}")
+
+    @staticmethod
+    async def send_chart(bot, user: int, chart: asyncio.Future) -> None:
+        await bot.send_photo(chat_id=user, photo=await chart)
 
     async def build_week_report(self, context):
         start_time, end_time = ut.get_prev_week_borders()
-        week_drawer = WeekDrawer()
+        week_drawer = WeekDrawer(**ut.config['charts']['week'])
         await self.build_report(context, week_drawer, start_time, end_time)
 
     async def build_month_report(self, context):
         start_time, end_time = ut.get_prev_month_borders()
-        month_drawer = MonthDrawer()
+        month_drawer = MonthDrawer(**ut.config['charts']['month'])
         await self.build_report(context, month_drawer, start_time, end_time)
         
     def add_repeat_jobs(self):
@@ -500,6 +626,8 @@ class Client:
 
     def build_conversation_handler(self):
         conv_handler = ConversationHandler(
+            name='main',
+            persistent=True,
             allow_reentry=True,
             entry_points=[
                     CommandHandler("start", self.start),
@@ -531,23 +659,55 @@ class Client:
         return conv_handler
 
     def add_callbacks(self):
-        callbacks = [
-            CallbackQueryHandler(self.process_dzyn_callback, pattern=ut.name_to_reg('dzyn')),
-            CallbackQueryHandler(self.proceed_mark_callback, pattern="^mark="),
-            CallbackQueryHandler(self.proceed_start_hour_callback, pattern="^start_hour="),
-            CallbackQueryHandler(self.proceed_end_hour_callback, pattern="^end_hour="),
-            CallbackQueryHandler(self.proceed_frequencies_callback, pattern="^freq="),
-            CallbackQueryHandler(self.proceed_minute_callback, pattern="^minute="),
-        ]
-        for callback in callbacks:
-            self.application.add_handler(callback)
-
+        router = CallbackRouter()
+        router.register(cr.DZYN, self.process_dzyn_callback)
+        router.register(cr.MARK, self.proceed_mark_callback)
+        router.register(cr.START_HOUR, self.proceed_start_hour_callback)
+        router.register(cr.END_HOUR, self.proceed_end_hour_callback)
+        router.register(cr.FREQUENCY, self.proceed_frequencies_callback)
+        router.register(cr.MINUTE, self.proceed_minute_callback)
+        self.application.add_handler(CallbackQueryHandler(router.dispatch))
+
+    def add_commands(self):
+        self.application.add_handler(CommandHandler("trend", self.send_trend_summary))
+        self.application.add_handler(CommandHandler("stats", self.send_admin_stats))
+        self.application.add_handler(CommandHandler("timezone", self.set_timezone))
+
+    def run_ingestion(self):
+        """blocks until a stop signal, pending updates, jobs and tasks are drained by application.stop()"""
+        mode = self.ingestion['mode']
+        drop_pending_updates = self.ingestion['drop_pending_updates']
+        if mode == 'polling':
+            self.application.run_polling(drop_pending_updates=drop_pending_updates)
+        elif mode == 'webhook':
+            secret_token = WEBHOOK_SECRET
+            if not secret_token:
+                # webhook is registered on every start, so a fresh secret is as good as a stored one
+                secret_token = secrets.token_urlsafe(32)
+                logger.info("webhook secret is not set, generated a new one")
+            self.application.run_webhook(
+                listen=self.ingestion['listen'],
+                port=self.ingestion['port'],
+                url_path=self.ingestion['url_path'],
+                webhook_url=self.ingestion['webhook_url'],
+                secret_token=secret_token,
+                max_connections=self.ingestion['max_connections'],
+                drop_pending_updates=drop_pending_updates,
+            )
+        else:
+            raise ValueError(f"unknown ingestion mode {mode=}")
 
-    def build_application(self):
+    def setup_application(self):
         self.initialize_jobs()
         conv_handler = self.build_conversation_handler()
         self.application.add_handler(conv_handler)
         self.add_callbacks()
+        self.add_commands()
         self.add_repeat_jobs()
-        self.application.run_polling(drop_pending_updates=True)
+
+    def build_application(self):
+        self.setup_application()
+        self.run_ingestion()
+        self.backend.close()
+        self.render_pool.close()
 
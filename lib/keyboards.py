@@ -1,10 +1,16 @@
+from functools import cache
+
 from telegram import ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime, timedelta
 import lib.utils as ut
+import lib.callback_router as cr
 
 menu_names = ut.get_menu_names()
 
+# telegram objects are immutable, so every keyboard is built once and shared
+
 
+@cache
 def activate() -> ReplyKeyboardMarkup:
     keyboard = [
         [menu_names.activate]
@@ -13,6 +19,7 @@ def activate() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
+@cache
 def main_menu() -> ReplyKeyboardMarkup:
     keyboard = [
         [menu_names.settings]
@@ -21,6 +28,7 @@ def main_menu() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
+@cache
 def settings(active_flag: bool) -> ReplyKeyboardMarkup:
     keyboard = [
         [menu_names.change_notification_time]
@@ -34,27 +42,31 @@ def settings(active_flag: bool) -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
+@cache
 def get_inline_mark() -> InlineKeyboardMarkup:
     row = []
     for ix, emoji in enumerate(['😐', '🤔', '😄', '😎', '🐕']):
-        button = InlineKeyboardButton(emoji, callback_data=f'mark={ix}')
+        button = InlineKeyboardButton(emoji, callback_data=cr.encode_callback(cr.MARK, ix))
         row.append(button)
 
     markup = InlineKeyboardMarkup([row])
     return markup
 
 
+@cache
 def dzyn_keyboard() -> InlineKeyboardMarkup:
-    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🥂", callback_data='dzyn')]])
+    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🥂", callback_data=cr.encode_callback(cr.DZYN))]])
     return reply_markup
 
 
+@cache
 def get_hours(label: str) -> InlineKeyboardMarkup:
+    kind = {'start': cr.START_HOUR, 'end': cr.END_HOUR}[label]
     keyboard = []
     curr_row = []
     for hour in range(24):
         str_hour = '0' + str(hour) if hour < 10 else str(hour)
-        button = InlineKeyboardButton(str_hour, callback_data=f"{label}_hour={hour}")
+        button = InlineKeyboardButton(str_hour, callback_data=cr.encode_callback(kind, hour))
         curr_row.append(button)
         if hour % 4 == 3:
             keyboard.append(curr_row)
@@ -62,11 +74,12 @@ def get_hours(label: str) -> InlineKeyboardMarkup:
     reply_markup = InlineKeyboardMarkup(keyboard)
     return reply_markup
 
+@cache
 def get_frequencies() -> InlineKeyboardMarkup:
     keyboard = []
     curr_row = []
-    for freq in range(12):
-        button = InlineKeyboardButton(str(freq), callback_data=f"freq={freq}")
+    for freq in range(1, 12):
+        button = InlineKeyboardButton(str(freq), callback_data=cr.encode_callback(cr.FREQUENCY, freq))
         curr_row.append(button)
         if freq % 4 == 3:
             keyboard.append(curr_row)
@@ -74,12 +87,13 @@ def get_frequencies() -> InlineKeyboardMarkup:
     reply_markup = InlineKeyboardMarkup(keyboard)
     return reply_markup
 
+@cache
 def get_minutes() -> InlineKeyboardMarkup:
     keyboard = []
     curr_row = []
     for minute in range(0, 60, 5):
         str_minute = '0' + str(minute) if minute < 10 else str(minute)
-        button = InlineKeyboardButton(str_minute, callback_data=f"minute={minute}")
+        button = InlineKeyboardButton(str_minute, callback_data=cr.encode_callback(cr.MINUTE, minute))
         curr_row.append(button)
         if minute % 20 == 15:
             keyboard.append(curr_row)
@@ -87,4 +101,3 @@ def get_minutes() -> InlineKeyboardMarkup:
 
     reply_markup = InlineKeyboardMarkup(keyboard)
     return reply_markup
-
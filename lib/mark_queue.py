@@ -0,0 +1,106 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MarkWriteQueue:
+    """write-behind buffer for mark rows: rows are collected by a background thread
+    and written with one call of flush_batch per batch_size rows or flush_interval seconds
+
+    failed batch is retried max_retries times with exponential backoff, if it still fails rows
+    are written one by one, so only rows which can not be written are dropped
+    """
+
+    def __init__(self, flush_batch: Callable[[list[dict]], None], batch_size: int = 200, flush_interval: float = 0.05,
+                 max_retries: int = 3, backoff: float = 0.1):
+        self.flush_batch = flush_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='mark-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, row: dict) -> None:
+        self._queue.put(row)
+
+    def _write(self, batch: list[dict]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.flush_batch(batch)
+                logger.info(f"{len(batch)} marks were flushed to DB")
+                return
+            except Exception as e:
+                logger.error(f"{len(batch)} marks were not flushed to DB, {attempt=}, exception - {e}")
+                if attempt < self.max_retries:
+                    # e.g. database is locked, writer thread waits and the queue keeps collecting rows
+                    time.sleep(self.backoff * 2 ** attempt)
+
+        if len(batch) > 1:
+            self._write_rows(batch)
+
+    def _write_rows(self, batch: list[dict]) -> None:
+        """write rows of a failed batch one by one, so a bad row does not drop the rest"""
+        dropped = 0
+        for row in batch:
+            try:
+                self.flush_batch([row])
+            except Exception as e:
+                dropped += 1
+                logger.error(f"mark {row} was dropped, exception - {e}")
+        logger.info(f"{len(batch) - dropped} marks were flushed to DB one by one, {dropped} dropped")
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            row = self._queue.get()
+            if row is _STOP:
+                break
+
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is _STOP:
+                    stop = True
+                    break
+                batch.append(row)
+
+            self._write(batch)
+
+    def flush(self) -> None:
+        """synchronously write everything which is left in the queue"""
+        batch = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not _STOP:
+                batch.append(row)
+
+            if len(batch) == self.batch_size:
+                self._write(batch)
+                batch = []
+
+        if batch:
+            self._write(batch)
+
+    def close(self) -> None:
+        """stop the writer thread and flush the rest of the queue, should be called on shutdown"""
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.flush()
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from telegram.ext import BasePersistence, PersistenceInput
+
+from db.tables import PersistedUserData, PersistedConversation
+
+logger = logging.getLogger(__name__)
+
+_DROPPED = object()
+
+
+class SQLitePersistence(BasePersistence):
+    """user_data and conversation states stored in the bot database
+
+    application hands over only changed entries once per update_interval, they are kept
+    as dirty entries and written with one transaction after every such run, so there is
+    no write per update
+    """
+
+    def __init__(self, engine: Engine, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.engine = engine
+        self._dirty_user_data: dict[int, object] = {}
+        self._dirty_conversations: dict[tuple[str, str], Optional[object]] = {}
+        self._write_lock = asyncio.Lock()
+        self._write_scheduled = False
+
+    @staticmethod
+    def _dump_key(key: tuple) -> str:
+        return json.dumps(list(key))
+
+    async def get_user_data(self) -> dict[int, dict]:
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(PersistedUserData.telegram_id, PersistedUserData.data)).all()
+        return {telegram_id: json.loads(data) for telegram_id, data in rows}
+
+    async def get_conversations(self, name: str) -> dict[tuple, object]:
+        stmt = select(PersistedConversation.key, PersistedConversation.state).where(PersistedConversation.name == name)
+        with self.engine.connect() as connection:
+            rows = connection.execute(stmt).all()
+        return {tuple(json.loads(key)): state for key, state in rows}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._dirty_user_data[user_id] = data
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._dirty_user_data[user_id] = _DROPPED
+        self._schedule_write()
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._dirty_conversations[(name, self._dump_key(key))] = new_state
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    def _schedule_write(self) -> None:
+        # all updates of one application run are handed over before the scheduled task starts
+        if not self._write_scheduled:
+            self._write_scheduled = True
+            asyncio.get_running_loop().create_task(self._write_dirty())
+
+    def _take_dirty(self) -> tuple[dict, dict]:
+        user_data, conversations = self._dirty_user_data, self._dirty_conversations
+        self._dirty_user_data, self._dirty_conversations = {}, {}
+        self._write_scheduled = False
+        return user_data, conversations
+
+    async def _write_dirty(self) -> None:
+        async with self._write_lock:
+            user_data, conversations = self._take_dirty()
+            loop = asyncio.get_running_loop()
+            written = await loop.run_in_executor(None, self._write, user_data, conversations)
+            if not written:
+                # keep entries for the next run unless they were changed meanwhile
+                for telegram_id, data in user_data.items():
+                    self._dirty_user_data.setdefault(telegram_id, data)
+                for item, state in conversations.items():
+                    self._dirty_conversations.setdefault(item, state)
+
+    def _write(self, user_data: dict, conversations: dict) -> bool:
+        if not user_data and not conversations:
+            return True
+
+        upsert_users = [
+            {'telegram_id': telegram_id, 'data': json.dumps(data)}
+            for telegram_id, data in user_data.items() if data is not _DROPPED
+        ]
+        dropped_users = [telegram_id for telegram_id, data in user_data.items() if data is _DROPPED]
+        upsert_conversations = [
+            {'name': name, 'key': key, 'state': state}
+            for (name, key), state in conversations.items() if state is not None
+        ]
+        ended_conversations = [item for item, state in conversations.items() if state is None]
+
+        try:
+            with self.engine.begin() as connection:
+                if upsert_users:
+                    stmt = sqlite_insert(PersistedUserData)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[PersistedUserData.telegram_id],
+                        set_={'data': stmt.excluded.data},
+                    )
+                    connection.execute(stmt, upsert_users)
+                if dropped_users:
+                    connection.execute(
+                        delete(PersistedUserData).where(PersistedUserData.telegram_id.in_(dropped_users))
+                    )
+                if upsert_conversations:
+                    stmt = sqlite_insert(PersistedConversation)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[PersistedConversation.name, PersistedConversation.key],
+                        set_={'state': stmt.excluded.state},
+                    )
+                    connection.execute(stmt, upsert_conversations)
+                for name, key in ended_conversations:
+                    connection.execute(
+                        delete(PersistedConversation)
+                        .where(PersistedConversation.name == name, PersistedConversation.key == key)
+                    )
+            logger.info(f"{len(user_data)} user data and {len(conversations)} conversations were persisted")
+            return True
+        except Exception as e:
+            logger.error(f"persistence was not written, exception - {e}")
+            return False
+
+    async def flush(self) -> None:
+        # called by application.stop() after the last update_persistence
+        await self._write_dirty()
+
+    # only user_data and conversations are stored, see store_data
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> Optional[tuple]:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: tuple) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
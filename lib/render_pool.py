@@ -0,0 +1,70 @@
+import asyncio
+import importlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from lib.chart_builder import ChartBuilder, ChartCache, chart_key
+from lib.trend import TrendStats
+
+logger = logging.getLogger(__name__)
+
+# chart dependencies imported by every worker before its first chart
+WARM_UP_MODULES = (
+    'numpy',
+    'PIL.Image',
+    'matplotlib.dates',
+    'matplotlib.figure',
+    'matplotlib.backends.backend_agg',
+)
+
+
+def _warm_up() -> None:
+    """executed once in every worker, so matplotlib import is not paid per chart"""
+    for module in WARM_UP_MODULES:
+        importlib.import_module(module)
+
+
+def _render(drawer: ChartBuilder, x_dates, y, trend) -> bytes:
+    return drawer.render(x_dates, y, trend)
+
+
+class ChartRenderPool:
+    """renders charts in worker processes, takes plain arrays and returns png bytes,
+    already rendered charts are returned from cache without touching the workers"""
+
+    def __init__(self, workers: int, cache_bytes: int = 64 * 2 ** 20):
+        self.workers = workers
+        self.cache = ChartCache(cache_bytes)
+        # the bot process already runs threads (mark writer, db pool), forking it could copy a held lock,
+        # so workers are forked by a clean forkserver process, chart dependencies are imported by _warm_up
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('forkserver'),
+            initializer=_warm_up,
+        )
+        logger.info(f"chart render pool with {workers=} was created")
+
+    def submit(self, drawer: ChartBuilder, x_dates, y, trend: TrendStats | None = None) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        key = chart_key(drawer, x_dates, y, trend)
+        chart = self.cache.get(key)
+        if chart is not None:
+            future = loop.create_future()
+            future.set_result(chart)
+            return future
+
+        future = loop.run_in_executor(self.executor, _render, drawer, x_dates, y, trend)
+        future.add_done_callback(partial(self._cache_chart, key))
+        return future
+
+    def _cache_chart(self, key: bytes, future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+
+    async def render(self, drawer: ChartBuilder, x_dates, y, trend: TrendStats | None = None) -> bytes:
+        return await self.submit(drawer, x_dates, y, trend)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
@@ -1 +1,236 @@
+import datetime as dt
+import logging
+from collections import defaultdict
 
+import pytz
+
+from configs.constants import TZ
+
+logger = logging.getLogger(__name__)
+
+MINUTES_IN_DAY = 24 * 60
+# no timezone changes its offset more often, it is the search step for the next transition
+TRANSITION_SEARCH_STEP = dt.timedelta(days=1)
+TRANSITION_SEARCH_LIMIT = dt.timedelta(days=400)
+# minutes missed by the tick are notified late, older ones (e.g. while the bot was down) are dropped
+MAX_CATCH_UP = dt.timedelta(minutes=15)
+
+
+def round_to_minute(moment: dt.datetime) -> dt.datetime:
+    """nearest whole utc minute, so slightly early or late tick gets the right slot"""
+    moment = moment.astimezone(dt.timezone.utc)
+    return (moment + dt.timedelta(seconds=30)).replace(second=0, microsecond=0)
+
+
+def utc_minute_of_day(moment: dt.datetime) -> int:
+    moment = round_to_minute(moment)
+    return moment.hour * 60 + moment.minute
+
+
+def seconds_to_next_minute(moment: dt.datetime) -> float:
+    return 60 - moment.second - moment.microsecond / 1e6
+
+
+def utc_offset_minutes(tz: dt.tzinfo, moment: dt.datetime) -> int:
+    return int(moment.astimezone(tz).utcoffset().total_seconds() // 60)
+
+
+def next_transition(tz: dt.tzinfo, moment: dt.datetime) -> dt.datetime | None:
+    """first instant after moment when utc offset of tz changes, None if it does not change within a year"""
+    offset = utc_offset_minutes(tz, moment)
+    low = moment
+    while low - moment < TRANSITION_SEARCH_LIMIT:
+        high = low + TRANSITION_SEARCH_STEP
+        if utc_offset_minutes(tz, high) != offset:
+            # offset is the old one at low and the new one at high
+            while high - low > dt.timedelta(seconds=1):
+                middle = low + (high - low) / 2
+                if utc_offset_minutes(tz, middle) == offset:
+                    low = middle
+                else:
+                    high = middle
+            return high.replace(microsecond=0)
+        low = high
+    return None
+
+
+class TimezoneOffsets:
+    """current utc offset of every used timezone, offset of a timezone is recomputed
+    only when its next transition instant has passed"""
+
+    def __init__(self):
+        self.offsets: dict[str, int] = {}
+        self.transitions: dict[str, dt.datetime | None] = {}
+        self._earliest_transition: dt.datetime | None = None
+
+    def offset(self, name: str, now: dt.datetime | None = None) -> int:
+        if name not in self.offsets:
+            self._compute(name, now or dt.datetime.now(dt.timezone.utc))
+        return self.offsets[name]
+
+    def _compute(self, name: str, now: dt.datetime) -> None:
+        tz = pytz.timezone(name)
+        self.offsets[name] = utc_offset_minutes(tz, now)
+        transition = self.transitions[name] = next_transition(tz, now)
+        if transition is not None and (self._earliest_transition is None or transition < self._earliest_transition):
+            self._earliest_transition = transition
+
+    def advance(self, now: dt.datetime) -> list[str]:
+        """recompute timezones whose transition has passed, returns those whose offset changed"""
+        if self._earliest_transition is None or now < self._earliest_transition:
+            return []
+
+        changed = []
+        passed = [name for name, transition in self.transitions.items() if transition is not None and transition <= now]
+        for name in passed:
+            offset = self.offsets[name]
+            self._compute(name, now)
+            if self.offsets[name] != offset:
+                changed.append(name)
+        pending = [transition for transition in self.transitions.values() if transition is not None]
+        self._earliest_transition = min(pending, default=None)
+        return changed
+
+
+class NotificationIndex:
+    """in-memory index of users who should be notified in every utc minute of the day,
+    one recurring tick reads it instead of one scheduler job per user per hour"""
+
+    def __init__(self):
+        self.slots: dict[int, set[int]] = defaultdict(set)
+        # registry of slots of every user, so reschedule touches only slots of that user
+        self.user_slots: dict[int, list[int]] = {}
+        # local minutes of day and timezone of every user, users of a timezone are re-bucketed at its transition
+        self.user_local_minutes: dict[int, list[int]] = {}
+        self.user_timezone: dict[int, str] = {}
+        self.timezone_users: dict[str, set[int]] = defaultdict(set)
+        self.offsets = TimezoneOffsets()
+        # users changed while the index is loaded in background, loaded rows of them are stale
+        self.loading = False
+        self._changed_while_loading: set[int] = set()
+        # last utc minute handed out by take_due
+        self.last_minute: dt.datetime | None = None
+
+    @staticmethod
+    def get_local_minutes(settings) -> list[int]:
+        return [
+            hour * 60 + settings.minute
+            for hour in range(settings.start_hour, settings.end_hour + 1, settings.frequency)
+        ]
+
+    def _insert(self, telegram_id: int, timezone: str, local_minutes: list[int]) -> list[int]:
+        offset = self.offsets.offset(timezone)
+        slots = [(minute - offset) % MINUTES_IN_DAY for minute in local_minutes]
+        for slot in slots:
+            self.slots[slot].add(telegram_id)
+        self.user_slots[telegram_id] = slots
+        self.user_local_minutes[telegram_id] = local_minutes
+        self.user_timezone[telegram_id] = timezone
+        self.timezone_users[timezone].add(telegram_id)
+        return slots
+
+    def _discard_slots(self, telegram_id: int) -> None:
+        for slot in self.user_slots.pop(telegram_id, ()):
+            users = self.slots[slot]
+            users.discard(telegram_id)
+            if not users:
+                del self.slots[slot]
+
+    def add_user(self, settings) -> list[int]:
+        self.remove_user(settings.telegram_id)
+        return self._insert(settings.telegram_id, settings.timezone or TZ, self.get_local_minutes(settings))
+
+    def remove_user(self, telegram_id: int) -> None:
+        if self.loading:
+            self._changed_while_loading.add(telegram_id)
+        self._discard_slots(telegram_id)
+        self.user_local_minutes.pop(telegram_id, None)
+        timezone = self.user_timezone.pop(telegram_id, None)
+        if timezone is not None:
+            self.timezone_users[timezone].discard(telegram_id)
+
+    def update_user(self, settings) -> list[int]:
+        if not settings.active_flag:
+            self.remove_user(settings.telegram_id)
+            return []
+        return self.add_user(settings)
+
+    def get_slots(self, telegram_id: int) -> list[int]:
+        return self.user_slots.get(telegram_id, [])
+
+    def rebuild(self, users: list) -> None:
+        self.slots.clear()
+        self.user_slots.clear()
+        self.user_local_minutes.clear()
+        self.user_timezone.clear()
+        self.timezone_users.clear()
+        for settings in users:
+            self.add_user(settings)
+        logger.info(f"notification index was built for {len(users)} users")
+
+    def apply_transitions(self, now: dt.datetime) -> int:
+        """move users of timezones which changed utc offset to their new slots, returns number of moved users"""
+        moved = 0
+        for timezone in self.offsets.advance(now):
+            users = list(self.timezone_users.get(timezone, ()))
+            for telegram_id in users:
+                self._discard_slots(telegram_id)
+                self._insert(telegram_id, timezone, self.user_local_minutes[telegram_id])
+            moved += len(users)
+            logger.info(f"{len(users)} users of {timezone} were moved to utc offset {self.offsets.offsets[timezone]}")
+        return moved
+
+    def begin_load(self, now: dt.datetime | None = None) -> None:
+        self.loading = True
+        self._changed_while_loading.clear()
+        # minutes which pass while loading are handed out by the first tick after it, see take_due
+        if self.last_minute is None:
+            self.last_minute = round_to_minute(now or dt.datetime.now(dt.timezone.utc)) - dt.timedelta(minutes=1)
+
+    def load_users(self, users: list) -> None:
+        """add a page of users read from db, users changed since loading began are kept as is"""
+        for settings in users:
+            if settings.telegram_id in self._changed_while_loading:
+                continue
+            # one bad row (e.g. frequency 0 or empty hours) should not stop loading of the rest
+            try:
+                local_minutes = self.get_local_minutes(settings)
+                self._insert(settings.telegram_id, settings.timezone or TZ, local_minutes)
+            except Exception as e:
+                logger.error(f"notifications for telegram_id = {settings.telegram_id} were not loaded, "
+                             f"{settings=}, exception - {e}")
+
+    def finish_load(self) -> None:
+        self.loading = False
+        self._changed_while_loading.clear()
+        logger.info(f"notification index was loaded for {len(self.user_slots)} users")
+
+    def due(self, minute_of_day: int) -> set[int]:
+        return set(self.slots.get(minute_of_day, ()))
+
+    def take_due(self, now: dt.datetime) -> dict[int, set[int]]:
+        """users due in every utc minute after the previous call up to now by minute of day,
+        so a minute skipped by the job queue is caught up by the next tick
+
+        nothing is handed out while the index is loaded, users of not yet loaded pages would miss
+        those minutes, they are caught up by the first tick after loading is finished"""
+        if self.loading:
+            return {}
+        now = round_to_minute(now)
+        if self.last_minute is None or now - self.last_minute > MAX_CATCH_UP:
+            minute = now
+        else:
+            minute = self.last_minute + dt.timedelta(minutes=1)
+            if minute < now:
+                logger.error(f"notifications from {minute:%H:%M} to {now:%H:%M} utc are sent late, ticks were missed")
+
+        due = {}
+        while minute <= now:
+            self.apply_transitions(minute)
+            minute_of_day = utc_minute_of_day(minute)
+            users = self.due(minute_of_day)
+            if users:
+                due[minute_of_day] = users
+            minute += dt.timedelta(minutes=1)
+        self.last_minute = max(now, self.last_minute or now)
+        return due
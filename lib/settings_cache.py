@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class UserSettings:
+    """immutable copy of user row, safe to share between threads and cache"""
+    telegram_id: int
+    frequency: int | None
+    start_hour: int | None
+    end_hour: int | None
+    minute: int | None
+    active_flag: bool
+    timezone: str | None = None
+
+    @classmethod
+    def from_row(cls, row) -> "UserSettings":
+        return cls(
+            telegram_id=row.telegram_id,
+            frequency=row.frequency,
+            start_hour=row.start_hour,
+            end_hour=row.end_hour,
+            minute=row.minute,
+            active_flag=bool(row.active_flag),
+            timezone=row.timezone,
+        )
+
+
+class SettingsCache:
+    """thread safe lru cache of user settings with hit and miss counters"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.data: OrderedDict[int, UserSettings] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # incremented on every write, value read before db query tells if it is still fresh
+        self.generation = 0
+
+    def get(self, telegram_id: int) -> tuple[UserSettings | None, int]:
+        """returns cached settings or None and generation to pass to put after db read"""
+        with self.lock:
+            settings = self.data.get(telegram_id)
+            if settings is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.data.move_to_end(telegram_id)
+            return settings, self.generation
+
+    def put(self, settings: UserSettings, generation: int | None = None) -> None:
+        with self.lock:
+            # settings were read before some write, they could be stale already
+            if generation is not None and generation != self.generation:
+                return
+            self.data[settings.telegram_id] = settings
+            self.data.move_to_end(settings.telegram_id)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def invalidate(self, telegram_id: int) -> None:
+        with self.lock:
+            self.generation += 1
+            self.data.pop(telegram_id, None)
+
+    def info(self) -> dict:
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.data),
+                'maxsize': self.maxsize,
+            }
@@ -1,4 +1,4 @@
-from sqlalchemy import insert, func
+from sqlalchemy import insert, select, update, func
 from sqlalchemy.orm import scoped_session
 from sqlalchemy.orm import sessionmaker
 
@@ -37,10 +37,12 @@ def db_selector(func):
 
 class TableProcessor:
 
-    def __init__(self, engine):
+    def __init__(self, engine, read_engine=None):
         session_factory = sessionmaker(bind=engine)
         self.Session = scoped_session(session_factory)
         self.sessionmaker = sessionmaker(engine)
+        # long read only queries (reports, analytics) go to separate pool, so they do not hold the writer
+        self.read_sessionmaker = sessionmaker(read_engine or engine)
 
     @db_selector
     def get_query_result(self, query: "sqlalchemy.orm.query.Query") -> list["table_model"]:
@@ -78,6 +80,21 @@ class TableProcessor:
             query = query.filter(getattr(table_model, filter_column) == filter_values[filter_column])
         query.update(change_values)
 
+    def _change_column_value_and_select(self, table_model, filter_values: dict, change_values: dict) -> list:
+        """apply all changes with one UPDATE and read changed rows back in the same transaction,
+        UPDATE ... RETURNING is not used as it needs sqlite 3.35"""
+        conditions = [
+            getattr(table_model, filter_column) == filter_values[filter_column] for filter_column in filter_values
+        ]
+        stmt = update(table_model).values(**change_values).where(*conditions)
+        query = select(*table_model.__table__.columns).where(*conditions)
+
+        with self.sessionmaker() as session, session.begin():
+            session.execute(stmt)
+            rows = session.execute(query).all()
+
+        return rows
+
     @db_selector
     def _get_max_value_of_column(self, table_model, column: str):
 
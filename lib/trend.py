@@ -0,0 +1,76 @@
+import datetime as dt
+from dataclasses import dataclass
+
+WINDOWS = ('week', 'month')
+# marks should be spread over about an hour at least to speak about a trend
+MIN_X_VARIANCE = (1 / 24) ** 2
+
+
+def get_window_start(window: str, day: dt.date) -> dt.date:
+    if window == 'week':
+        return day - dt.timedelta(days=day.weekday())
+    if window == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"unknown trend window {window}")
+
+
+def days_since(window_start: dt.date, moment: dt.datetime) -> float:
+    return (moment - dt.datetime.combine(window_start, dt.time())).total_seconds() / 86400
+
+
+@dataclass(frozen=True)
+class TrendStats:
+    """sufficient statistics of least squares line y = slope * x + intercept,
+    x is number of days since window_start"""
+    window_start: dt.date
+    n: int
+    sum_x: float
+    sum_y: float
+    sum_xy: float
+    sum_xx: float
+
+    @classmethod
+    def from_row(cls, row) -> "TrendStats":
+        return cls(row.window_start, row.n, row.sum_x, row.sum_y, row.sum_xy, row.sum_xx)
+
+    @property
+    def mean(self) -> float:
+        return self.sum_y / self.n
+
+    @property
+    def slope(self) -> float:
+        if self.n < 2:
+            return 0.
+        variance_x = self.sum_xx / self.n - (self.sum_x / self.n) ** 2
+        if variance_x < MIN_X_VARIANCE:
+            return 0.
+        covariance = self.sum_xy / self.n - self.sum_x * self.sum_y / self.n ** 2
+        return covariance / variance_x
+
+    @property
+    def intercept(self) -> float:
+        return (self.sum_y - self.slope * self.sum_x) / self.n
+
+    def predict(self, x: float) -> float:
+        return self.slope * x + self.intercept
+
+
+def trend_summary_text(current: TrendStats | None, previous: TrendStats | None = None,
+                       window: str = 'week') -> str:
+    if current is None:
+        return f"📭 there are no marks for this {window} yet"
+
+    slope = current.slope
+    if slope > 0.05:
+        text = f"📈 your mood trended up this {window} ({slope:+.2f} per day)"
+    elif slope < -0.05:
+        text = f"📉 your mood trended down this {window} ({slope:+.2f} per day)"
+    else:
+        text = f"➡️ your mood was stable this {window}"
+
+    text += f"\naverage mark: {current.mean + 1:.1f} from {current.n} marks"
+    if previous is not None:
+        delta = current.mean - previous.mean
+        text += f"\nlast {window}: {previous.mean + 1:.1f} ({delta:+.1f})"
+
+    return text
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """updates of different users are processed concurrently, updates of one user one by one
+    in arrival order, so the conversation state of a user is never changed by two updates at once
+
+    key of an update is (chat_id, user_id) as in conversation handler, updates without chat
+    and user are processed at once
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks: dict[tuple, asyncio.Lock] = {}
+        self._waiting: dict[tuple, int] = {}
+
+    @staticmethod
+    def get_key(update: object) -> tuple | None:
+        if not isinstance(update, Update):
+            return None
+        chat, user = update.effective_chat, update.effective_user
+        if chat is None and user is None:
+            return None
+        return chat.id if chat else None, user.id if user else None
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # per user lock is taken before a slot of the concurrency semaphore (taken by the base method),
+        # so queued updates of one busy user wait without holding slots other users need
+        key = self.get_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            # lock of a user is kept only while there are updates of the user
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -1,8 +1,7 @@
 import yaml
-import pytz
 from dataclasses import make_dataclass
+from functools import cache
 from configs.definitions import ROOT_DIR
-from configs.constants import TZ
 import datetime as dt
 from dateutil.relativedelta import relativedelta
 
@@ -14,18 +13,31 @@ def read_config(config_path: str) -> dict:
 
 
 CONFIG_PATH = ROOT_DIR + '/configs/config.yaml'
-config = read_config(CONFIG_PATH)
 
 
+@cache
+def get_config() -> dict:
+    return read_config(CONFIG_PATH)
+
+
+def __getattr__(name: str):
+    # `config` is read on first access and shared by all modules
+    if name == 'config':
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@cache
 def get_menu_names():
-    menu_naming = config['menu_naming']
+    menu_naming = get_config()['menu_naming']
     MenuNames = make_dataclass("MenuNames", [(eng, str, rus) for eng, rus in menu_naming.items()])
     menu_names = MenuNames()
 
     return menu_names
 
+@cache
 def get_texts():
-    text_config = config['texts']
+    text_config = get_config()['texts']
     Texts = make_dataclass("Texts", [(eng, str, rus) for eng, rus in text_config.items()])
     texts = Texts()
 
@@ -36,14 +48,6 @@ def name_to_reg(name: str) -> str:
     return f"^{name}$"
 
 
-def time_to_utc(hour: int, minute: int) -> dt.time:
-    current_time = dt.datetime.now()
-    local = pytz.timezone(TZ)
-    local_dt = local.localize(current_time)
-    local_dt = local_dt.replace(hour=hour, minute=minute, second=0)
-    utc_time = local_dt.astimezone(pytz.utc).time()
-    return utc_time
-
 def date_to_datetime(date_object: dt.date) -> dt.datetime:
     return dt.datetime.fromordinal(date_object.toordinal())
 
@@ -22,11 +22,10 @@ date_start, date_end = ut.get_prev_week_borders()
 
 backend = Backend(bd_path)
 #'😐', '🤔', '😄', '😎', '🐕'
-res = backend.get_last_marks(telegram_id=256856117, date_start=date_start, date_end=date_end).answer
+x_dates, marks = backend.get_mark_arrays(telegram_id=256856117, date_start=date_start, date_end=date_end).answer
 
-x_dates = [el.mark_time for el in res]
 # x_nums = dates.date2num(x_dates)
-y = [el.mark + 1 for el in res]
+y = marks + 1
 
 # month_drawer = MonthDrawer()
 # buf = month_drawer.draw(x_dates, y)